@@ -1,8 +1,8 @@
 import django_filters
-from django.db.models import Value, CharField, Q
+from django.db.models import Value, CharField
 from django.db.models.functions import Concat
 
-from apps.core.models import Author
+from apps.core.models import Author, Catalog
 
 
 class AuthorFilter(django_filters.FilterSet):
@@ -28,9 +28,9 @@ class AuthorFilter(django_filters.FilterSet):
         qs = super().qs
 
         if not self.request.user.is_authenticated:
-            return qs.filter(catalog__is_public=True)
+            return qs.filter(catalog_id__any=Catalog.public_ids())
 
         if not self.request.user.is_superuser:
-            qs = qs.filter(Q(catalog__users=self.request.user) | Q(catalog__is_public=True))
+            qs = qs.filter(catalog_id__any=self.request.user.accessible_catalog_ids)
 
         return qs
@@ -1,5 +1,4 @@
 import django_filters
-from django.db.models import Q
 
 from apps.core.models import Catalog
 
@@ -20,6 +19,6 @@ class CatalogFilter(django_filters.FilterSet):
             return qs.filter(is_public=True)
 
         if not self.request.user.is_superuser:
-            qs = qs.filter(Q(users=self.request.user) | Q(is_public=True))
+            qs = qs.filter(id__any=self.request.user.accessible_catalog_ids)
 
         return qs
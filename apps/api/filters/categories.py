@@ -1,8 +1,8 @@
 import django_filters
-from django.db.models import Value, CharField, Q
+from django.db.models import Value, CharField
 from django.db.models.functions import Concat
 
-from apps.core.models import Category
+from apps.core.models import Category, Catalog
 
 
 class CategoryFilter(django_filters.FilterSet):
@@ -29,9 +29,9 @@ class CategoryFilter(django_filters.FilterSet):
         qs = super().qs
 
         if not self.request.user.is_authenticated:
-            return qs.filter(catalog__is_public=True)
+            return qs.filter(catalog_id__any=Catalog.public_ids())
 
         if not self.request.user.is_superuser:
-            qs = qs.filter(Q(catalog__users=self.request.user) | Q(catalog__is_public=True))
+            qs = qs.filter(catalog_id__any=self.request.user.accessible_catalog_ids)
 
         return qs
@@ -7,7 +7,7 @@ from django.db.models import Q
 from django.utils.translation import gettext as _
 from partial_date import PartialDate
 
-from apps.core.models import Entry, Language, Category, Author
+from apps.core.models import Entry, Language, Category, Author, Catalog
 from apps.opds.structures import Facet
 
 
@@ -101,16 +101,18 @@ class EntryFilter(django_filters.FilterSet):
         qs = super().qs
 
         if not self.request.user.is_authenticated:
-            return qs.filter(catalog__is_public=True)
+            return qs.filter(catalog_id__any=Catalog.public_ids())
 
         if not self.request.user.is_superuser:
-            qs = qs.filter(Q(catalog__users=self.request.user) | Q(catalog__is_public=True))
+            qs = qs.filter(catalog_id__any=self.request.user.accessible_catalog_ids)
 
         return qs
 
     @staticmethod
     def filter_author(qs, name, value):
-        return qs.filter(Q(authors__name__unaccent__icontains=value) | Q(authors__surname__unaccent__icontains=value))
+        return qs.filter(
+            Q(authors__name__unaccent__icontains=value) | Q(authors__surname__unaccent__icontains=value)
+        ).distinct()
 
     @staticmethod
     def filter_author_id(qs, name, value):
@@ -122,7 +124,7 @@ class EntryFilter(django_filters.FilterSet):
             Q(title__unaccent__icontains=value)
             | Q(summary__unaccent__icontains=value)
             | Q(feeds__title__icontains=value)
-        )
+        ).distinct()
 
     @staticmethod
     def filter_published_at_gte(qs, name, value):
@@ -33,7 +33,9 @@ class ShelfRecordFilter(django_filters.FilterSet):
             return qs.none()
 
         if not self.request.user.is_superuser:
-            qs = qs.filter(Q(entry__catalog__users=self.request.user) & Q(user=self.request.user))
+            qs = qs.filter(
+                entry__catalog_id__any=list(self.request.user.catalog_permissions.keys()), user=self.request.user
+            )
 
         return qs
 
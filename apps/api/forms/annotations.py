@@ -1,8 +1,13 @@
+import xml.etree.ElementTree as ET
+
 from django import forms
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.utils.translation import gettext as _
 from django_api_forms import Form
 
 from apps.core.models import UserAcquisition, Annotation
+from apps.core.modifiers.pdf.annotations import compile_annotation
 
 
 class CreateAnnotationForm(Form):
@@ -18,3 +23,11 @@ class AnnotationItemForm(Form):
     annotation_id = forms.ModelChoiceField(queryset=Annotation.objects.all())
     content = forms.CharField()
     page = forms.IntegerField(validators=[MinValueValidator(1)])
+
+    def clean_content(self) -> str:
+        try:
+            compile_annotation(self.cleaned_data["content"])
+        except (ET.ParseError, ValueError):
+            raise ValidationError(_("Invalid SVG content"), "invalid")
+
+        return self.cleaned_data["content"]
@@ -63,6 +63,14 @@ class EntryConfigForm(Form):
             ("page", _("Page render type")),
         ),
     )
+    evilflowers_pdf_profile = forms.ChoiceField(
+        required=False,
+        choices=(
+            ("fast", _("Fast PDF output")),
+            ("balanced", _("Balanced PDF output")),
+            ("archival", _("Archival PDF output")),
+        ),
+    )
 
 
 class EntryForm(Form):
@@ -1,8 +1,10 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext as _
 from django_api_forms import Form
 
-from apps.core.fields.multirange import MultiRangeFormField
-from apps.core.models import Acquisition, UserAcquisition
+from apps.core.fields.multirange import MultiRangeFormField, PageRanges
+from apps.core.models import Acquisition, UserAcquisition, PageIndex
 
 
 class UserAcquisitionForm(Form):
@@ -10,3 +12,19 @@ class UserAcquisitionForm(Form):
     type = forms.ChoiceField(choices=UserAcquisition.UserAcquisitionType.choices)
     range = MultiRangeFormField(required=False)
     expire_at = forms.DateTimeField(required=False)
+
+    def clean(self):
+        acquisition = self.cleaned_data.get("acquisition_id")
+        pages = self.cleaned_data.get("range")
+
+        # Ranges of acquisitions which are not indexed yet are not validated
+        if acquisition and pages:
+            page_count = PageIndex.objects.filter(acquisition=acquisition).values_list("page_count", flat=True).first()
+
+            if page_count is not None and len(pages & PageRanges([(1, page_count)])) != len(pages):
+                raise ValidationError(
+                    _("Range contains pages outside of the document (1-%(page_count)d)") % {"page_count": page_count},
+                    "invalid",
+                )
+
+        return self.cleaned_data
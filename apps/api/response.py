@@ -1,11 +1,14 @@
+import base64
 import json
+import uuid
 from dataclasses import dataclass
 from http import HTTPStatus
-from typing import Optional, List, Type, TypeVar
+from typing import Optional, List, Type, TypeVar, Iterator
 
 from django.conf import settings
+from django.core.files import File
 from django.core.paginator import Paginator, EmptyPage
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.utils.translation import gettext as _
 from pydantic import BaseModel, RootModel
 
@@ -173,6 +176,53 @@ class PaginationResponse(GeneralResponse):
         )
 
 
+class Base64StreamingResponse(StreamingHttpResponse):
+    """
+    SingleResponse with one string field containing base64 encoded file. The file is read and encoded in chunks
+    (multiples of 3 bytes, so encoded chunks can be concatenated), memory usage does not depend on the file size.
+    """
+
+    chunk_size = 3 * 64 * 1024
+
+    def __init__(
+        self,
+        request,
+        file: File,
+        *,
+        data: Optional[Serializer] = None,
+        field: str = "data",
+        prefix: str = "",
+        **kwargs,
+    ):
+        marker = uuid.uuid4().hex
+
+        if data is None:
+            data = {field: marker}
+        else:
+            data = data.model_copy(update={field: marker})
+
+        head, tail = SingleResponseModel(response=data).model_dump_json(by_alias=True).split(f'"{marker}"', 1)
+        head = f'{head}"{prefix}'.encode()
+        tail = f'"{tail}'.encode()
+
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(streaming_content=self._stream(file, head, tail), **kwargs)
+        self["Content-Length"] = str(len(head) + (file.size + 2) // 3 * 4 + len(tail))
+
+    def _stream(self, file: File, head: bytes, tail: bytes) -> Iterator[bytes]:
+        yield head
+
+        remainder = b""
+        for chunk in file.chunks(self.chunk_size):
+            chunk = remainder + chunk
+            cut = len(chunk) - len(chunk) % 3
+            remainder = chunk[cut:]
+            yield base64.b64encode(chunk[:cut])
+
+        yield base64.b64encode(remainder)
+        yield tail
+
+
 class SeeOtherResponse(HttpResponseRedirect):
     status_code = 303
 
@@ -183,5 +233,6 @@ __all__ = [
     "PaginationResponse",
     "ValidationResponse",
     "SeeOtherResponse",
+    "Base64StreamingResponse",
     "Ordering",
 ]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from uuid import UUID
 
 from pydantic import Field, field_validator
@@ -41,6 +41,13 @@ class LanguageSerializer:
         alpha3: str
 
 
+class PageIndexSerializer:
+    class Base(Serializer):
+        page_count: int
+        # Run-length encoded page sizes [width, height, count] in points
+        sizes: List[Tuple[float, float, int]]
+
+
 class AcquisitionSerializer:
     class Nested(Serializer):
         relation: Acquisition.AcquisitionType
@@ -55,8 +62,11 @@ class AcquisitionSerializer:
         id: UUID
 
     class Detailed(Base):
-        base64: Optional[str] = Field(serialization_alias="content")
+        # Embedded only on demand using streaming response (see AcquisitionDetail)
+        embedded_content: Optional[str] = Field(serialization_alias="content", default=None)
         checksum: Optional[str]
+        # Built in the background, missing until the acquisition is indexed
+        page_index: Optional[PageIndexSerializer.Base] = None
 
 
 class EntrySerializer:
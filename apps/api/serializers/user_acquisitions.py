@@ -24,6 +24,10 @@ class UserAcquisitionSerializer:
         created_at: datetime
         updated_at: datetime
 
+        @field_validator("range", mode="before")
+        def format_range(cls, v) -> Optional[str]:
+            return str(v) if v else None
+
         @field_validator("url", mode="before")
         def generate_absolute_url(cls, v, info: ValidationInfo) -> Optional[UUID]:
             return info.context["request"].build_absolute_uri(v)
@@ -1,5 +1,4 @@
 import mimetypes
-import uuid
 from functools import reduce
 from io import BytesIO
 from operator import or_
@@ -76,10 +75,8 @@ class EntryService:
             )
 
             if "content" in record.keys():
-                acquisition.content.save(
-                    f"{uuid.uuid4()}{mimetypes.guess_extension(acquisition.mime)}",
-                    record["content"],
-                )
+                acquisition.store_content(record["content"], mimetypes.guess_extension(acquisition.mime))
+                acquisition.save()
 
             for price in record.get("prices", []):
                 Price.objects.create(
@@ -8,7 +8,7 @@ from apps import openapi
 from apps.api.filters.acquisitions import AcquisitionFilter
 from apps.api.forms.entries import AcquisitionMetaForm
 from apps.core.errors import ProblemDetailException, ValidationException
-from apps.api.response import SingleResponse, PaginationResponse
+from apps.api.response import SingleResponse, PaginationResponse, Base64StreamingResponse
 from apps.api.serializers.entries import AcquisitionSerializer
 from apps.core.models import Acquisition
 from apps.core.views import SecuredView
@@ -44,10 +44,18 @@ class AcquisitionDetail(SecuredView):
     @openapi.metadata(description="Get Acquisition detail", tags=["Acquisitions"])
     def get(self, request, acquisition_id: UUID):
         acquisition = self._get_acquisition(request, acquisition_id, "check_catalog_read")
-
-        return SingleResponse(
-            request, data=AcquisitionSerializer.Detailed.model_validate(acquisition, context={"request": request})
-        )
+        data = AcquisitionSerializer.Detailed.model_validate(acquisition, context={"request": request})
+
+        if request.GET.get("content", None) == "true" and acquisition.content:
+            return Base64StreamingResponse(
+                request,
+                acquisition.content,
+                data=data,
+                field="embedded_content",
+                prefix=f"data:{acquisition.mime};base64,",
+            )
+
+        return SingleResponse(request, data=data)
 
     @openapi.metadata(
         description="Content of Acquisition is imutable from the API users perspective. You can only Acquisition "
@@ -1,9 +1,11 @@
 import json
 import mimetypes
 from http import HTTPStatus
-from uuid import uuid4, UUID
+from uuid import UUID
 
 from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext as _
 from object_checker.base_object_checker import has_object_permission
@@ -30,13 +32,14 @@ def shelf_record_mapping(user: User) -> dict[UUID, UUID]:
 class EntryPaginator(SecuredView):
     @openapi.metadata(description="List Entries", tags=["Entries"])
     def get(self, request):
-        entries = (
-            EntryFilter(request.GET, queryset=Entry.objects.all(), request=request)
-            .qs.distinct()
-            .prefetch_related("acquisitions")
-            .all()
+        entries = EntryFilter(request.GET, queryset=Entry.objects.all(), request=request).qs.prefetch_related(
+            "acquisitions"
         )
 
+        # Time-decayed popularity (order_by=-trending), entries without recent downloads are the least trending
+        if "trending" in request.GET.get("order_by", ""):
+            entries = entries.annotate(trending=Coalesce("ranking__score", Value(float("-inf"))))
+
         return PaginationResponse(
             request,
             entries,
@@ -150,10 +153,8 @@ class EntryDetail(SecuredView):
         )
 
         if "content" in request.FILES.keys():
-            acquisition.content.save(
-                f"{uuid4()}{mimetypes.guess_extension(acquisition.mime)}",
-                request.FILES["content"],
-            )
+            acquisition.store_content(request.FILES["content"], mimetypes.guess_extension(acquisition.mime))
+            acquisition.save()
 
         for price in form.cleaned_data.get("prices", []):
             Price.objects.create(
@@ -10,10 +10,26 @@ from apps.api.filters.feeds import FeedFilter
 from apps.api.forms.feeds import FeedForm
 from apps.api.response import SingleResponse, PaginationResponse
 from apps.api.serializers.feeds import FeedSerializer
-from apps.core.models import Feed
+from apps.core.models import Feed, Catalog
+from apps.core.permissions import has_objects_permission
 from apps.core.views import SecuredView
 
 
+def check_related(request, form: FeedForm):
+    """
+    Catalogs of entries and parents of the feed have to be readable by the user, all of them are evaluated at once.
+    """
+    catalog_ids = {
+        item.catalog_id
+        for item in [*(form.cleaned_data.get("entries") or []), *(form.cleaned_data.get("parents") or [])]
+    }
+
+    if catalog_ids and not all(
+        has_objects_permission("check_catalog_read", request.user, Catalog.objects.filter(pk__in=catalog_ids)).values()
+    ):
+        raise ProblemDetailException(_("Insufficient permissions"), status=HTTPStatus.FORBIDDEN)
+
+
 class FeedManagement(SecuredView):
     @openapi.metadata(description="Create Feed", tags=["Feeds"])
     def post(self, request):
@@ -25,6 +41,8 @@ class FeedManagement(SecuredView):
         if not has_object_permission("check_catalog_read", request.user, form.cleaned_data["catalog_id"]):
             raise ProblemDetailException(_("Insufficient permissions"), status=HTTPStatus.FORBIDDEN)
 
+        check_related(request, form)
+
         # FIXME: Probably not working
         if Feed.objects.filter(
             catalog=form.cleaned_data["catalog_id"],
@@ -89,6 +107,8 @@ class FeedDetail(SecuredView):
         if not form.is_valid():
             raise ValidationException(form)
 
+        check_related(request, form)
+
         if (
             Feed.objects.filter(
                 catalog=form.cleaned_data["catalog_id"],
@@ -0,0 +1,210 @@
+import atexit
+import logging
+import os
+import threading
+import uuid
+from datetime import UTC, date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.redis import get_redis
+
+ANALYTICS_STREAM_KEY = "evilflowers:downloads"
+ANALYTICS_GROUP = "ingest"
+ANALYTICS_CONSUMER = "ingest"
+ANALYTICS_LOCK_KEY = "evilflowers:downloads:lock"
+
+EVENT_FIELDS = ("id", "created_at", "acquisition_id", "entry_id", "catalog_id", "user_id", "user_acquisition_id")
+
+
+class EventBuffer:
+    """
+    In-process buffer of download events. Events are pushed to the Redis stream in one pipeline when the buffer is
+    full, after EVILFLOWERS_ANALYTICS_BUFFER_TIMEOUT or when the process exits, so the download path never waits
+    for more than a list append. Events are dropped (with a warning) if Redis is not available.
+    """
+
+    def __init__(self):
+        self._events: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def append(self, event: Dict[str, str]):
+        events = None
+
+        with self._lock:
+            self._events.append(event)
+
+            if len(self._events) >= settings.EVILFLOWERS_ANALYTICS_BUFFER_SIZE:
+                events = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(
+                    settings.EVILFLOWERS_ANALYTICS_BUFFER_TIMEOUT.total_seconds(), self.flush
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+        if events:
+            self._push(events)
+
+    def flush(self):
+        with self._lock:
+            events = self._take()
+
+        if events:
+            self._push(events)
+
+    def reset(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _take(self) -> List[Dict[str, str]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        events, self._events = self._events, []
+        return events
+
+    @staticmethod
+    def _push(events: List[Dict[str, str]]):
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            for event in events:
+                pipeline.xadd(
+                    ANALYTICS_STREAM_KEY,
+                    event,
+                    maxlen=settings.EVILFLOWERS_ANALYTICS_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            pipeline.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Unable to push {len(events)} download events: {e}")
+
+
+_buffer = EventBuffer()
+atexit.register(_buffer.flush)
+
+# Events buffered by the parent process must not be pushed again from forked workers
+os.register_at_fork(after_in_child=_buffer.reset)
+
+
+def record(acquisition, user_acquisition=None, user=None):
+    """
+    Record download of the acquisition (optionally as the user acquisition) by the user.
+    """
+    if user is not None and not user.is_authenticated:
+        user = None
+
+    _buffer.append(
+        {
+            "id": str(uuid.uuid4()),
+            "created_at": timezone.now().isoformat(),
+            "acquisition_id": str(acquisition.pk),
+            "entry_id": str(acquisition.entry_id),
+            "catalog_id": str(acquisition.entry.catalog_id),
+            "user_id": str(user.pk) if user else "",
+            "user_acquisition_id": str(user_acquisition.pk) if user_acquisition else "",
+        }
+    )
+
+
+def _ensure_partitions(cursor, months: set):
+    for month in months:
+        upper = (month + timedelta(days=32)).replace(day=1)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS download_events_{month:%Y_%m} PARTITION OF download_events "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [datetime.combine(month, time.min, UTC), datetime.combine(upper, time.min, UTC)],
+        )
+
+
+def ingest(batch_size: int = 10000) -> int:
+    """
+    Move events from the Redis stream into the partitioned download_events table using COPY. Events are acknowledged
+    and removed from the stream after the commit, events of a failed run stay pending and are retried first.
+    Returns number of ingested events.
+    """
+    client = get_redis()
+
+    try:
+        client.xgroup_create(ANALYTICS_STREAM_KEY, ANALYTICS_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    lock = client.lock(ANALYTICS_LOCK_KEY, timeout=settings.EVILFLOWERS_ANALYTICS_INGEST_INTERVAL.total_seconds())
+    if not lock.acquire(blocking=False):
+        return 0
+
+    ingested = 0
+
+    try:
+        # "0" reads pending events of this consumer, ">" reads new ones
+        for start in ("0", ">"):
+            while True:
+                response = client.xreadgroup(
+                    ANALYTICS_GROUP, ANALYTICS_CONSUMER, {ANALYTICS_STREAM_KEY: start}, count=batch_size
+                )
+                messages = response[0][1] if response else []
+
+                if not messages:
+                    break
+
+                rows = [
+                    [fields[field.encode()].decode() or None for field in EVENT_FIELDS]
+                    for message_id, fields in messages
+                    if fields
+                ]
+
+                with transaction.atomic(), connection.cursor() as cursor:
+                    _ensure_partitions(
+                        cursor,
+                        {datetime.fromisoformat(row[1]).astimezone(UTC).date().replace(day=1) for row in rows},
+                    )
+                    with cursor.copy(f"COPY download_events ({', '.join(EVENT_FIELDS)}) FROM STDIN") as copy:
+                        for row in rows:
+                            copy.write_row(row)
+
+                message_ids = [message_id for message_id, fields in messages]
+                client.xack(ANALYTICS_STREAM_KEY, ANALYTICS_GROUP, *message_ids)
+                client.xdel(ANALYTICS_STREAM_KEY, *message_ids)
+                ingested += len(rows)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            logging.warning("Download events ingest took longer than its lock timeout")
+
+    return ingested
+
+
+def rollup(day: Optional[date] = None) -> int:
+    """
+    (Re)compute daily download statistics of entries for the day (today by default, in TIME_ZONE). Rollup is
+    idempotent and can be run repeatedly while the day is not over. Returns number of rolled up entries.
+    """
+    day = day or timezone.localdate()
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO download_statistics (date, entry_id, catalog_id, downloads, users) "
+            "SELECT %s, entries.id, entries.catalog_id, COUNT(*), COUNT(DISTINCT download_events.user_id) "
+            "FROM download_events JOIN entries ON entries.id = download_events.entry_id "
+            "WHERE download_events.created_at >= %s AND download_events.created_at < %s "
+            "GROUP BY entries.id, entries.catalog_id "
+            "ON CONFLICT (date, entry_id) DO UPDATE SET "
+            "catalog_id = EXCLUDED.catalog_id, downloads = EXCLUDED.downloads, users = EXCLUDED.users",
+            [day, start, end],
+        )
+        return cursor.rowcount
+
+
+__all__ = ["record", "ingest", "rollup"]
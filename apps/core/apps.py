@@ -1,5 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
     name = "apps.core"
+
+    def ready(self):
+        from apps.core import lookups  # noqa: F401
+
+        self._check_modifier_profiles()
+
+    @staticmethod
+    def _check_modifier_profiles():
+        # PyMuPDF is an optional dependency, profiles are checked only if the PDF modifier is used
+        if "apps.core.modifiers.pdf.PDFModifier" not in settings.EVILFLOWERS_MODIFIERS.values():
+            return
+
+        from apps.core.modifiers.pdf import PROFILES
+
+        for name in ("EVILFLOWERS_MODIFIERS_PROFILE_PAGE", "EVILFLOWERS_MODIFIERS_PROFILE_DOCUMENT"):
+            if getattr(settings, name) not in PROFILES:
+                raise ImproperlyConfigured(
+                    f"{name}({getattr(settings, name)}) has to be one of the PDF output profiles: {', '.join(PROFILES)}"
+                )
@@ -17,14 +17,14 @@ class CatalogChecker(AbacChecker):
         if not user.is_authenticated:
             return False
 
-        return obj.user_catalogs.filter(user=user, mode=UserCatalog.Mode.MANAGE).exists()
+        return user.catalog_permissions.get(obj.pk) == UserCatalog.Mode.MANAGE
 
     @staticmethod
     def check_catalog_write(user: User, obj: Catalog) -> bool:
         if not user.is_authenticated:
             return False
 
-        return obj.user_catalogs.filter(user=user, mode__in=[UserCatalog.Mode.MANAGE, UserCatalog.Mode.WRITE]).exists()
+        return user.catalog_permissions.get(obj.pk) in [UserCatalog.Mode.MANAGE, UserCatalog.Mode.WRITE]
 
     @staticmethod
     def check_catalog_read(user: User, obj: Catalog) -> bool:
@@ -34,7 +34,7 @@ class CatalogChecker(AbacChecker):
         if not user.is_authenticated:
             return False
 
-        return obj.users.contains(user)
+        return obj.pk in user.catalog_permissions
 
 
 class EntryChecker(AbacChecker):
@@ -46,14 +46,14 @@ class EntryChecker(AbacChecker):
         if obj.creator_id == user.id:
             return True
 
-        return obj.catalog.user_catalogs.filter(user=user, mode=UserCatalog.Mode.MANAGE).exists()
+        return user.catalog_permissions.get(obj.catalog_id) == UserCatalog.Mode.MANAGE
 
     @staticmethod
     def check_entry_read(user: User, obj: Entry) -> bool:
         if not user.is_authenticated:
             return False
 
-        return obj.catalog.users.contains(user)
+        return obj.catalog_id in user.catalog_permissions
 
 
 class UserAcquisitionChecker(AbacChecker):
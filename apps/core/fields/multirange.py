@@ -1,118 +1,194 @@
-import re
-from operator import itemgetter
-from itertools import groupby
+from bisect import bisect_right
+from typing import Iterable, Iterator, Optional, Tuple
+
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.forms import CharField
+from django.utils.translation import gettext as _
+from psycopg.types.multirange import Multirange
+from psycopg.types.range import Range
 
-"""
-Based on the work of Mark Boszko
-https://djangosnippets.org/snippets/3070/
-"""
+# Ranges are stored with exclusive upper bound in int4multirange
+MAX_PAGE = 2**31 - 2
 
 
-class MultiRangeField(models.CharField):
-    description = "A multi-range of integers (e.g. page numbers 30, 41, 51-57, 68)"
+class PageRanges:
+    """
+    Normalized set of pages (positive integers) kept as sorted, disjoint and non-adjacent inclusive intervals
+    (e.g. "30, 41, 51-57, 68"). Membership, union, intersection, count and indexing cost O(number of intervals),
+    pages are never expanded into a list.
+    """
 
-    def __init__(self, *args, **kwargs):
-        kwargs["max_length"] = 1000
-        kwargs["help_text"] = "Comma-separated pages and page ranges."
-        super(MultiRangeField, self).__init__(*args, **kwargs)
+    __slots__ = ("intervals",)
 
-    def get_internal_type(self):
-        return "CharField"
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        normalized = []
 
-    def to_python(self, value: str) -> str:
-        if not value:
-            return ""
-        # Validate
-        if re.match("^[0-9, -]*$", value):
-            return repack(depack(value))
-        # else something's wrong.
-        return value
-
-    def get_prep_value(self, value):
-        if not value:
-            return ""
-        return repack(depack(value))
+        # Intervals of union are two sorted runs, sorting them is linear
+        for start, end in sorted(intervals):
+            if start > end:
+                continue
+            if normalized and start <= normalized[-1][1] + 1:
+                normalized[-1] = (normalized[-1][0], max(normalized[-1][1], end))
+            else:
+                normalized.append((start, end))
 
-    def value_to_string(self, obj):
-        value = self.value_from_object(obj)
-        return repack(depack(value))
+        self.intervals: Tuple[Tuple[int, int], ...] = tuple(normalized)
 
-    def formfield(self, **kwargs):
-        defaults = {"form_class": MultiRangeFormField}
-        defaults.update(kwargs)
-        return super(MultiRangeField, self).formfield(**defaults)
+    @classmethod
+    def parse(cls, value: str) -> "PageRanges":
+        """
+        Parse comma-separated pages and page ranges. Raises ValueError if the value is not valid.
+        """
+        intervals = []
 
-    def clean(self, value, model_instance):
-        if re.match("^[0-9, -]*$", value):
-            return repack(depack(value))
-        else:
-            # Turn all other characters into commas, because it's probably a typo
-            value = re.sub("[^0-9, -]", ",", value)
-            return repack(depack(value))
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
 
+            start, separator, end = part.partition("-")
+            start = int(start)
+            end = int(end) if separator else start
 
-class MultiRangeFormField(CharField):
-    def validate(self, value):
+            if start < 1 or start > end or end > MAX_PAGE:
+                raise ValueError(f"Invalid page range {part}")
+
+            intervals.append((start, end))
+
+        return cls(intervals)
+
+    def __str__(self) -> str:
+        return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in self.intervals)
+
+    def __repr__(self) -> str:
+        return f"PageRanges({str(self)!r})"
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __contains__(self, page: int) -> bool:
+        index = bisect_right(self.intervals, (page, float("inf"))) - 1
+        return index >= 0 and self.intervals[index][1] >= page
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __getitem__(self, index: int) -> int:
         """
-        Check if the value consts of valid page ranges,
-        with only numbers, hyphens, commas, and spaces
-        :param value:str
-        :return:
+        Page at the position (from 0) in the ordered set.
         """
-        if re.match("^[0-9, -]*$", value):
-            return repack(depack(value))
-        # Comment this out if you'd rather just have it auto-clean your entry
-        else:
-            raise ValidationError("Can only contain numbers, hyphens, commas, and spaces.")
+        if index < 0:
+            index += len(self)
 
+        if index >= 0:
+            for start, end in self.intervals:
+                if index <= end - start:
+                    return start + index
+                index -= end - start + 1
 
-def depack(value: str) -> list:
-    """
-    Unpacks a string representation of integers and ranges into a list of ints
-    """
-    page_list = []
-
-    for part in value.strip().split(","):
-        if "-" in part:
-            # It's a range
-            a, b = part.split("-")
-            a, b = int(a), int(b)
-            page_list.extend(range(a, b + 1))
-        else:
-            # Make sure that it contains a number before we add it.
-            if re.match("[0-9]+", part):
-                a = int(part)
-                page_list.append(a)
-    return page_list
-
-
-def repack(page_list: list) -> str:
+        raise IndexError("Page index out of range")
+
+    def __or__(self, other: "PageRanges") -> "PageRanges":
+        return PageRanges(self.intervals + other.intervals)
+
+    def __and__(self, other: "PageRanges") -> "PageRanges":
+        intervals = []
+        i = j = 0
+
+        while i < len(self.intervals) and j < len(other.intervals):
+            start = max(self.intervals[i][0], other.intervals[j][0])
+            end = min(self.intervals[i][1], other.intervals[j][1])
+
+            if start <= end:
+                intervals.append((start, end))
+
+            if self.intervals[i][1] < other.intervals[j][1]:
+                i += 1
+            else:
+                j += 1
+
+        return PageRanges(intervals)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PageRanges) and self.intervals == other.intervals
+
+    def __hash__(self) -> int:
+        return hash(self.intervals)
+
+
+class MultiRangeField(models.Field):
     """
-    Returns a string representation from integers in a list
+    PageRanges stored as PostgreSQL int4multirange (page ranges can be queried in SQL, e.g. range__contains=page).
+    Empty set is stored as NULL, like a missing range it means no restriction.
     """
-    # Need to sort the list first, so that we can combine runs into ranges
-    sorted_values = sorted(page_list, key=int)
 
-    ranges = []
+    description = "A multi-range of integers (e.g. page numbers 30, 41, 51-57, 68)"
 
-    def function(input_tuple):
-        return input_tuple[0] - input_tuple[1]
+    def db_type(self, connection) -> str:
+        return "int4multirange"
 
-    for key, group in groupby(enumerate(sorted_values), function):
-        group = list(map(itemgetter(1), group))
-        if len(group) > 1:
-            ranges.append(range(group[0], group[-1]))  # under Python 3.x, switch to "range"
-        else:
-            ranges.append(group[0])
+    def from_db_value(self, value, expression, connection) -> Optional[PageRanges]:
+        return self.to_python(value)
+
+    def to_python(self, value) -> Optional[PageRanges]:
+        if value is None or isinstance(value, PageRanges):
+            return value
+
+        if isinstance(value, str):
+            try:
+                return PageRanges.parse(value)
+            except ValueError:
+                raise ValidationError(_("Invalid page range"), "invalid")
+
+        # Multirange of discrete ranges is normalized by PostgreSQL to [lower, upper)
+        return PageRanges((item.lower, item.upper - 1) for item in value)
+
+    def get_prep_value(self, value) -> Optional[Multirange]:
+        value = self.to_python(value)
+
+        if not value:
+            return None
 
-    ranges_strings = []
-    for item in ranges:
-        if isinstance(item, range):
-            ranges_strings.append(f"{item[0]}-{item[-1] + 1}")  # 1-2
-        else:
-            ranges_strings.append(str(item))  # 1
+        return Multirange([Range(start, end + 1, "[)") for start, end in value.intervals])
 
-    return ", ".join(ranges_strings)
+    def value_to_string(self, obj) -> str:
+        value = self.value_from_object(obj)
+        return str(value) if value else ""
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{"form_class": MultiRangeFormField, **kwargs})
+
+
+@MultiRangeField.register_lookup
+class MultiRangeContains(models.Lookup):
+    lookup_name = "contains"
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @> {rhs}::integer", (*lhs_params, *rhs_params)
+
+    def get_db_prep_lookup(self, value, connection):
+        # Page number, not a multirange
+        return "%s", [int(value)]
+
+
+class MultiRangeFormField(CharField):
+    def to_python(self, value) -> Optional[PageRanges]:
+        value = super().to_python(value)
+
+        if not value:
+            return None
+
+        try:
+            return PageRanges.parse(value)
+        except ValueError:
+            raise ValidationError(
+                _("Can only contain page numbers and page ranges separated by commas (e.g. 1-5, 8)."), "invalid"
+            )
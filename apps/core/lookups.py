@@ -0,0 +1,25 @@
+from django.db.models import Field, Lookup
+from django.db.models.fields.related import ForeignObject
+
+
+class AnyLookup(Lookup):
+    """
+    PostgreSQL `column = ANY(%s)` lookup. Unlike `__in`, the whole list is sent as a single array parameter, so the
+    statement stays the same no matter how many values are used.
+    """
+
+    lookup_name = "any"
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return "%s", [list(value)]
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} = ANY({rhs})", (*lhs_params, *rhs_params)
+
+
+Field.register_lookup(AnyLookup)
+# ForeignObject does not inherit lookups registered on Field
+ForeignObject.register_lookup(AnyLookup)
@@ -0,0 +1,76 @@
+import io
+import statistics
+import time
+
+import fitz
+from django.core.files import File
+from django.core.management import BaseCommand
+
+from apps.core.modifiers.pdf import PDFModifier, PROFILES
+
+
+class Command(BaseCommand):
+    help = "Measure PDFModifier latency and output size on synthetic (or given) documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, nargs="+", default=[50, 1000], help="Page counts of documents")
+        parser.add_argument("--input", type=str, nargs="*", default=[], help="Paths to PDF documents")
+        parser.add_argument(
+            "--profile", type=str, nargs="+", choices=PROFILES.keys(), default=list(PROFILES), help="Output profiles"
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs (median is reported)")
+
+    @staticmethod
+    def _document(pages: int) -> bytes:
+        document = fitz.open()
+
+        for index in range(pages):
+            page = document.new_page(width=595, height=842)
+            page.insert_textbox(
+                fitz.Rect(50, 50, 545, 792),
+                f"Page {index + 1}\n\n" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40,
+                fontsize=10,
+            )
+
+        return document.tobytes(garbage=3, deflate=True)
+
+    def _measure(self, data: bytes, repeat: int, profile: str, page_num=None):
+        timings = []
+        size = 0
+
+        for _ in range(repeat):
+            modifier = PDFModifier(
+                context={
+                    "id": "00000000-0000-0000-0000-000000000000",
+                    "user_id": "00000000-0000-0000-0000-000000000000",
+                    "username": "benchmark",
+                    "title": "Benchmark",
+                    "authors": "EvilFlowers",
+                    "language": None,
+                },
+                pages=None,
+            )
+
+            started_at = time.perf_counter()
+            output = modifier.generate(File(io.BytesIO(data)), page_num, profile=profile)
+            timings.append(time.perf_counter() - started_at)
+            size = len(output.read())
+
+        return statistics.median(timings), size
+
+    def handle(self, *args, **options):
+        documents = [(f"synthetic ({pages} pages)", self._document(pages)) for pages in options["pages"]]
+
+        for path in options["input"]:
+            with open(path, "rb") as f:
+                documents.append((path, f.read()))
+
+        self.stdout.write(f"{'document':<40} {'mode':<10} {'profile':<10} {'input':>12} {'output':>12} {'time':>10}")
+
+        for name, data in documents:
+            for mode, page_num in (("document", None), ("page", 3)):
+                for profile in options["profile"]:
+                    duration, size = self._measure(data, options["repeat"], profile, page_num)
+                    self.stdout.write(
+                        f"{name:<40} {mode:<10} {profile:<10} {len(data):>12} {size:>12} {duration * 1000:>8.0f}ms"
+                    )
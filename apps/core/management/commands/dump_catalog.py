@@ -1,18 +1,22 @@
+import io
 import os
 import tarfile
 import tempfile
-from io import BytesIO
-from uuid import UUID
 from collections import defaultdict, deque
+from itertools import batched
+from typing import Iterable, List
+from uuid import UUID
 
 from django.conf import settings
 from django.core.management import BaseCommand
 from django.core.serializers import serialize
+from django.db import transaction
+from django.db.models import Model, QuerySet
 from django.utils import timezone
 
 from apps.core.management.compression import XZCompressionStrategy, PlainCompressionStrategy
 from apps.core.management.storage import S3DestinationStrategy, LocalDestinationStrategy
-from apps.core.models import Catalog, Entry, Acquisition, Feed, Category, Price, Author, EntryAuthor
+from apps.core.models import Catalog, Entry, Acquisition, Feed, Category, Price, Author, EntryAuthor, Blob
 
 
 class Command(BaseCommand):
@@ -26,40 +30,50 @@ class Command(BaseCommand):
         parser.add_argument(
             "-c", "--compression", type=str, default="none", choices=["none", "xz"], help="Compression algorithm"
         )
+        parser.add_argument(
+            "--chunk-size", type=int, default=10000, help="Number of objects in one entities/*.jsonl member"
+        )
 
-    @classmethod
-    def _add_file_to_tar(cls, tar: tarfile.TarFile, filename: str, content: BytesIO) -> None:
-        tarinfo = tarfile.TarInfo(name=filename)
-        tarinfo.size = len(content.getvalue())
-        tar.addfile(tarinfo, content)
+    @staticmethod
+    def _add_chunk_to_tar(tar: tarfile.TarFile, filename: str, objects: Iterable[Model]) -> None:
+        """
+        Serialize objects as JSON lines into a temporary file (size of the member has to be known before it is
+        written) and add it to the archive.
+        """
+        with tempfile.TemporaryFile() as f:
+            stream = io.TextIOWrapper(f, encoding="utf-8")
+            serialize("jsonl", objects, stream=stream)
+            stream.flush()
+            stream.detach()
+
+            tarinfo = tarfile.TarInfo(name=filename)
+            tarinfo.size = f.tell()
+            f.seek(0)
+            tar.addfile(tarinfo, f)
 
     @staticmethod
-    def _topological_sort_feeds(feeds):
-        """Perform a topological sort of feeds based on parent-child relationships."""
-        # Build the graph
-        graph = defaultdict(list)
-        in_degree = defaultdict(int)
-
-        # Initialize the in-degree count and graph
-        for feed in feeds:
-            # Ensure every feed has an entry in the graph
-            in_degree[feed.pk] = in_degree.get(feed.pk, 0)
-
-            # Process parent-child relationships
-            for parent in feed.parents.all():
-                graph[parent.pk].append(feed.pk)
-                in_degree[feed.pk] += 1
-
-        # Perform Kahn's Algorithm for topological sorting
+    def _topological_sort_feeds(catalog: Catalog) -> List[UUID]:
+        """
+        Identifiers of feeds of the catalog sorted topologically (parents first) by Kahn's algorithm in O(V + E).
+        """
+        feeds = list(Feed.objects.filter(catalog=catalog).values_list("pk", flat=True))
+        children = defaultdict(list)
+        in_degree = dict.fromkeys(feeds, 0)
+
+        for child_pk, parent_pk in Feed.parents.through.objects.filter(from_feed__catalog=catalog).values_list(
+            "from_feed_id", "to_feed_id"
+        ):
+            children[parent_pk].append(child_pk)
+            in_degree[child_pk] += 1
+
         sorted_feeds = []
-        zero_in_degree_queue = deque([feed.pk for feed in feeds if in_degree[feed.pk] == 0])
+        zero_in_degree_queue = deque(pk for pk in feeds if in_degree[pk] == 0)
 
         while zero_in_degree_queue:
             current_feed_pk = zero_in_degree_queue.popleft()
-            current_feed = next(feed for feed in feeds if feed.pk == current_feed_pk)
-            sorted_feeds.append(current_feed)
+            sorted_feeds.append(current_feed_pk)
 
-            for child_pk in graph[current_feed_pk]:
+            for child_pk in children[current_feed_pk]:
                 in_degree[child_pk] -= 1
                 if in_degree[child_pk] == 0:
                     zero_in_degree_queue.append(child_pk)
@@ -69,6 +83,13 @@ class Command(BaseCommand):
 
         return sorted_feeds
 
+    @staticmethod
+    def _sorted_feeds(sorted_feeds: List[UUID], chunk_size: int) -> Iterable[Feed]:
+        for pks in batched(sorted_feeds, chunk_size):
+            feeds = Feed.objects.prefetch_related("parents", "entries").in_bulk(pks)
+            for pk in pks:
+                yield feeds[pk]
+
     def handle(self, *args, **options):
         started_at = timezone.now()
         self.stdout.write(f"Started: {started_at.isoformat()}")
@@ -95,9 +116,7 @@ class Command(BaseCommand):
         self.stdout.write(f"Preparing to backup catalog {catalog.title} ({catalog.pk})")
 
         try:
-            sorted_feeds = self._topological_sort_feeds(
-                Feed.objects.filter(catalog=catalog).prefetch_related("parents")
-            )
+            sorted_feeds = self._topological_sort_feeds(catalog)
         except ValueError as e:
             self.stderr.write(self.style.ERROR(str(e)))
             return
@@ -111,26 +130,32 @@ class Command(BaseCommand):
         with tempfile.NamedTemporaryFile(delete=False, suffix=compressor.suffix()) as tmp:
             tmp_file = tmp.name
 
-        with compressor.open_tarfile(tmp_file) as tar:
-            self._add_file_to_tar(
-                tar,
-                "entities.json",
-                BytesIO(
-                    serialize(
-                        "json",
-                        [
-                            *Catalog.objects.filter(pk=catalog.pk),
-                            *Category.objects.filter(catalog=catalog),
-                            *Author.objects.filter(catalog=catalog),
-                            *Entry.objects.filter(catalog=catalog),
-                            *EntryAuthor.objects.filter(entry__catalog=catalog),
-                            *Acquisition.objects.filter(entry__catalog=catalog),
-                            *Price.objects.filter(acquisition__entry__catalog=catalog),
-                            *sorted_feeds,
-                        ],
-                    ).encode("utf-8")
-                ),
-            )
+        chunk_size = options["chunk_size"]
+
+        # Entities are streamed from server-side cursors (iterator) in one transaction, members are numbered in the
+        # order they have to be loaded
+        with compressor.open_tarfile(tmp_file) as tar, transaction.atomic():
+            querysets: List[QuerySet] = [
+                Catalog.objects.filter(pk=catalog.pk),
+                Category.objects.filter(catalog=catalog),
+                Author.objects.filter(catalog=catalog),
+                Entry.objects.filter(catalog=catalog).prefetch_related("categories"),
+                EntryAuthor.objects.filter(entry__catalog=catalog),
+                Blob.objects.filter(acquisitions__entry__catalog=catalog).distinct(),
+                Acquisition.objects.filter(entry__catalog=catalog),
+                Price.objects.filter(acquisition__entry__catalog=catalog),
+            ]
+            chunks = [
+                (queryset.model, batched(queryset.iterator(chunk_size=chunk_size), chunk_size))
+                for queryset in querysets
+            ]
+            chunks.append((Feed, batched(self._sorted_feeds(sorted_feeds, chunk_size), chunk_size)))
+
+            index = 0
+            for model, model_chunks in chunks:
+                for chunk in model_chunks:
+                    self._add_chunk_to_tar(tar, f"entities/{index:06d}-{model._meta.label_lower}.jsonl", chunk)
+                    index += 1
 
             # Optionally add related static files.
             if not options["skip_files"]:
@@ -139,6 +164,11 @@ class Command(BaseCommand):
                         f"{settings.EVILFLOWERS_STORAGE_FILESYSTEM_DATADIR}/catalogs/{catalog.url_name}",
                         f"storage/catalogs/{catalog.url_name}",
                     )
+                    for blob in Blob.objects.filter(acquisitions__entry__catalog=catalog).distinct().iterator():
+                        tar.add(
+                            f"{settings.EVILFLOWERS_STORAGE_FILESYSTEM_DATADIR}/{blob.content.name}",
+                            f"storage/{blob.content.name}",
+                        )
 
         output = options.get("output") or f"{catalog.url_name}.{compressor.suffix()}"
 
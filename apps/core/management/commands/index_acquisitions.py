@@ -0,0 +1,21 @@
+from celery import signature
+from django.core.management import BaseCommand
+
+from apps.core.models import Acquisition
+
+
+class Command(BaseCommand):
+    help = "Build page indexes of PDF acquisitions which do not have one (or of all with --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild existing page indexes too")
+
+    def handle(self, *args, **options):
+        acquisitions = Acquisition.objects.filter(mime=Acquisition.AcquisitionMIME.PDF, content__isnull=False)
+
+        if not options["all"]:
+            acquisitions = acquisitions.filter(page_index__isnull=True)
+
+        for acquisition in acquisitions.iterator():
+            signature("apps.tasks.tasks.index_acquisition", args=[str(acquisition.pk)], immutable=True).apply_async()
+            self.stdout.write(f"Indexing {acquisition.pk}")
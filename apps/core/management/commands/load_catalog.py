@@ -2,13 +2,16 @@ import tarfile
 import tempfile
 import shutil
 import os
+from typing import Iterable
 
 from django.conf import settings
 from django.core.management import BaseCommand
 from django.core.serializers import deserialize
+from django.core.serializers.base import DeserializedObject
+from django.db.models import Count
 from django.utils import timezone
 
-from apps.core.models import User, Catalog
+from apps.core.models import User, Catalog, Blob
 from apps.files.storage import get_storage
 
 
@@ -19,6 +22,31 @@ class Command(BaseCommand):
         parser.add_argument("--skip-files", action="store_true", help="Skip static files")
         parser.add_argument("--input", type=str, required=True, help="Path to the tar archive")
 
+    def _entities(self, tar: tarfile.TarFile) -> Iterable[DeserializedObject]:
+        """
+        Deserialized objects of the archive: chunked entities/*.jsonl members (read line by line in the order of their
+        names) or entities.json of older archives.
+        """
+        members = sorted(
+            (member for member in tar.getmembers() if member.isfile() and member.name.startswith("entities/")),
+            key=lambda member: member.name,
+        )
+
+        if not members:
+            try:
+                entities_file = tar.extractfile("entities.json")
+            except KeyError:
+                entities_file = None
+
+            if not entities_file:
+                raise FileNotFoundError("entities.json not found in the archive!")
+
+            yield from deserialize("json", entities_file.read().decode("utf-8"))
+            return
+
+        for member in members:
+            yield from deserialize("jsonl", tar.extractfile(member))
+
     def handle(self, *args, **options):
         started_at = timezone.now()
         self.stdout.write(f"Started: {started_at.isoformat()}")
@@ -31,28 +59,33 @@ class Command(BaseCommand):
                 with tarfile.open(tar_file_path, "r") as tar:
                     self.stdout.write(f"Opened TAR file: {tar_file_path}")
 
-                    # Extract entities.json containing serialized data
-                    entities_file = tar.extractfile("entities.json")
-                    if not entities_file:
-                        self.stderr.write(f"entities.json not found in the archive!")
-                        return
-
-                    entities_data = entities_file.read().decode("utf-8")
-                    deserialized_objects = list(deserialize("json", entities_data))
                     catalog_names = []
-
-                    self.stdout.write(f"Deserialized {len(deserialized_objects)} objects from entities.json")
+                    blob_checksums = []
+                    count = 0
 
                     # Iterate over deserialized data and save objects
-                    for obj in deserialized_objects:
+                    for obj in self._entities(tar):
                         if isinstance(obj.object, Catalog):
                             catalog_names.append(obj.object.url_name)
 
+                        # Blobs may be already shared with other catalogs, references are recalculated later
+                        if isinstance(obj.object, Blob):
+                            blob_checksums.append(obj.object.checksum)
+                            if Blob.objects.filter(pk=obj.object.checksum).exists():
+                                continue
+
                         if hasattr(obj.object, "creator_id"):
                             obj.object.creator_id = User.objects.filter(is_superuser=True).first().pk
                         obj.save()
+                        count += 1
                         self.stdout.write(f"Saved {obj.object.__class__.__name__}: {obj.object.pk}")
 
+                    self.stdout.write(f"Saved {count} objects")
+
+                    for blob in Blob.objects.filter(pk__in=blob_checksums).annotate(count=Count("acquisitions")):
+                        blob.references = blob.count
+                        blob.save(update_fields=["references"])
+
                     # Check for storage directory and extract it
                     if not options["skip_files"]:
                         if settings.EVILFLOWERS_STORAGE_DRIVER == "apps.files.storage.filesystem.FileSystemStorage":
@@ -73,6 +106,14 @@ class Command(BaseCommand):
                                     destination,
                                 )
 
+                            blobs_source = os.path.join(extracted_storage_path, "blobs")
+                            if os.path.exists(blobs_source):
+                                shutil.copytree(
+                                    blobs_source,
+                                    os.path.join(destination_storage_path, "blobs"),
+                                    dirs_exist_ok=True,
+                                )
+
                         elif settings.EVILFLOWERS_STORAGE_DRIVER == "apps.files.storage.s3.S3Storage":
                             tar.extractall(path=temp_dir)
                             storage = get_storage()
@@ -89,6 +130,11 @@ class Command(BaseCommand):
                                             os.path.join(destination, entry_id, file), os.path.join(root, file)
                                         )
 
+                            for blob in Blob.objects.filter(pk__in=blob_checksums):
+                                source = os.path.join(extracted_storage_path, blob.content.name)
+                                if os.path.exists(source) and not storage.exists(blob.content.name):
+                                    storage.save_from_path(blob.content.name, source)
+
             except (tarfile.TarError, FileNotFoundError) as e:
                 self.stderr.write(f"Error processing TAR file: {e}")
                 return
@@ -0,0 +1,84 @@
+import uuid
+from io import UnsupportedOperation
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+
+from apps.files.storage import HashingReader, checksum_cache_key
+
+
+class BlobManager(models.Manager):
+    def store(self, content: File, extension: Optional[str]):
+        """
+        Store content as a content-addressed blob (keyed by SHA-256). Content is hashed in the same pass as it is
+        uploaded under a temporary name, then it is moved to its content address (or dropped if the blob already
+        exists). Reference is not taken here, see acquire().
+        """
+        storage = self.model._meta.get_field("content").storage
+
+        try:
+            content.seek(0)
+        except (AttributeError, UnsupportedOperation):
+            pass
+
+        # Wrapped stream is never moved as a whole file, every storage has to read (and hash) it
+        reader = HashingReader(content)
+        upload = File(reader, name=content.name)
+        upload.size = content.size
+        temporary = storage.save(f"blobs/uploads/{uuid.uuid4()}{extension or ''}", upload)
+        checksum = reader.checksum
+
+        blob = self.filter(pk=checksum).first()
+        if blob:
+            storage.delete(temporary)
+            return blob
+
+        blob = self.model(checksum=checksum, size=reader.size, references=0)
+        blob.content.name = storage.move(
+            temporary, blob.content.field.generate_filename(blob, f"{checksum}{extension or ''}")
+        )
+        cache.set(
+            checksum_cache_key(blob.content.name), checksum, settings.EVILFLOWERS_CACHE_SERVER_HASHES.total_seconds()
+        )
+
+        try:
+            with transaction.atomic():
+                blob.save(force_insert=True)
+        except IntegrityError:
+            # Concurrent upload of the same content won, drop our copy (unless it was stored under the same name)
+            existing = self.get(pk=checksum)
+            if existing.content.name != blob.content.name:
+                blob.content.delete(save=False)
+            blob = existing
+
+        return blob
+
+    def acquire(self, blob):
+        """
+        Increment reference counter of the blob. Has to be called in the transaction which saves the referencing
+        object, so a failed save does not leak the reference.
+        """
+        if not self.filter(pk=blob.pk).update(references=F("references") + 1):
+            raise self.model.DoesNotExist(f"Blob {blob.pk} does not exist")
+        blob.refresh_from_db(fields=["references"])
+
+    def release(self, checksum: str):
+        """
+        Decrement reference counter of the blob, the blob and its content are removed with the last reference.
+        """
+        with transaction.atomic():
+            blob = self.select_for_update().filter(pk=checksum).first()
+
+            if not blob:
+                return
+
+            if blob.references > 1:
+                blob.references -= 1
+                blob.save(update_fields=["references"])
+            else:
+                blob.delete()
+                transaction.on_commit(lambda: blob.content.storage.delete(blob.content.name))
@@ -0,0 +1,40 @@
+import zlib
+
+import fitz
+from django.db import models
+
+
+class PageIndexManager(models.Manager):
+    def build(self, acquisition):
+        """
+        Extract page count, page sizes and text layer of the PDF acquisition and store (or replace) its page index.
+        """
+        sizes = []
+        texts = []
+
+        with acquisition.content.open("rb") as f:
+            stream = f.read()
+
+        with fitz.open(stream=stream, filetype="pdf") as document:
+            page_count = len(document)
+
+            for page in document:
+                size = [round(page.rect.width, 2), round(page.rect.height, 2)]
+
+                if sizes and sizes[-1][:2] == size:
+                    sizes[-1][2] += 1
+                else:
+                    sizes.append([*size, 1])
+
+                texts.append(page.get_text().replace(self.model.PAGE_SEPARATOR, " "))
+
+        page_index, _ = self.update_or_create(
+            acquisition=acquisition,
+            defaults={
+                "page_count": page_count,
+                "sizes": sizes,
+                "text": zlib.compress(self.model.PAGE_SEPARATOR.join(texts).encode(), 9),
+            },
+        )
+
+        return page_index
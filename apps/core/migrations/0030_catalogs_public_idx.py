@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0029_m2n_unique_constrains"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="catalog",
+            index=models.Index(condition=models.Q(("is_public", True)), fields=["id"], name="catalogs_public_idx"),
+        ),
+    ]
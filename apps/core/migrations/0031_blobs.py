@@ -0,0 +1,49 @@
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+import apps.core.models.blob
+import apps.files.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0030_catalogs_public_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                ("checksum", models.CharField(max_length=64, primary_key=True, serialize=False)),
+                (
+                    "content",
+                    models.FileField(
+                        max_length=255,
+                        storage=apps.files.storage.get_storage,
+                        upload_to=apps.core.models.blob.Blob._upload_to_path,
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField()),
+                ("references", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                "verbose_name": "Blob",
+                "verbose_name_plural": "Blobs",
+                "db_table": "blobs",
+                "default_permissions": (),
+            },
+        ),
+        migrations.AddField(
+            model_name="acquisition",
+            name="blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="acquisitions",
+                to="core.blob",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Snapshot of apps.core.popularity at the time of this migration (POPULARITY_EPOCH, decay_offset)
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+POPULARITY_HALF_LIFE = getattr(settings, "EVILFLOWERS_POPULARITY_HALF_LIFE", timedelta(days=14))
+
+
+def seed_rankings(apps, schema_editor):
+    """
+    Lifetime popularity is considered as downloaded at the time of migration, so existing entries are not empty
+    until they are downloaded again.
+    """
+    offset = (timezone.now() - POPULARITY_EPOCH).total_seconds() * math.log(2) / POPULARITY_HALF_LIFE.total_seconds()
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO entry_rankings (entry_id, catalog_id, score, updated_at) "
+            "SELECT id, catalog_id, LN(popularity) + %s, NOW() FROM entries WHERE popularity > 0",
+            [offset],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0031_blobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EntryRanking",
+            fields=[
+                (
+                    "entry",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ranking",
+                        serialize=False,
+                        to="core.entry",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "catalog",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.catalog",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Entry ranking",
+                "verbose_name_plural": "Entry rankings",
+                "db_table": "entry_rankings",
+                "default_permissions": (),
+                "indexes": [models.Index(fields=["catalog_id", "-score"], name="entry_rankings_top_idx")],
+            },
+        ),
+        migrations.RunPython(seed_rankings, migrations.RunPython.noop),
+    ]
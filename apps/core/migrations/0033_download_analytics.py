@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0032_entry_rankings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DownloadEvent",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField()),
+                ("acquisition_id", models.UUIDField()),
+                ("entry_id", models.UUIDField()),
+                ("catalog_id", models.UUIDField()),
+                ("user_id", models.UUIDField(null=True)),
+                ("user_acquisition_id", models.UUIDField(null=True)),
+            ],
+            options={
+                "verbose_name": "Download event",
+                "verbose_name_plural": "Download events",
+                "db_table": "download_events",
+                "managed": False,
+                "default_permissions": (),
+            },
+        ),
+        migrations.RunSQL(
+            sql=[
+                "CREATE TABLE download_events ("
+                "id uuid NOT NULL, "
+                "created_at timestamp with time zone NOT NULL, "
+                "acquisition_id uuid NOT NULL, "
+                "entry_id uuid NOT NULL, "
+                "catalog_id uuid NOT NULL, "
+                "user_id uuid NULL, "
+                "user_acquisition_id uuid NULL"
+                ") PARTITION BY RANGE (created_at)",
+                # Events are appended in time order, BRIN is enough for day ranges of rollups
+                "CREATE INDEX download_events_created_at_idx ON download_events USING brin (created_at)",
+            ],
+            reverse_sql="DROP TABLE download_events",
+        ),
+        migrations.CreateModel(
+            name="DownloadStatistic",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("date", models.DateField()),
+                ("downloads", models.PositiveIntegerField(default=0)),
+                ("users", models.PositiveIntegerField(default=0)),
+                (
+                    "catalog",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="download_statistics",
+                        to="core.catalog",
+                    ),
+                ),
+                (
+                    "entry",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="download_statistics",
+                        to="core.entry",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Download statistic",
+                "verbose_name_plural": "Download statistics",
+                "db_table": "download_statistics",
+                "default_permissions": (),
+                "indexes": [models.Index(fields=["catalog_id", "date"], name="download_statistics_catalog_idx")],
+                "constraints": [
+                    models.UniqueConstraint(fields=("date", "entry"), name="download_statistics_date_entry_unique")
+                ],
+            },
+        ),
+    ]
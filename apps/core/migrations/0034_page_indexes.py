@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0033_download_analytics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageIndex",
+            fields=[
+                (
+                    "acquisition",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="page_index",
+                        serialize=False,
+                        to="core.acquisition",
+                    ),
+                ),
+                ("page_count", models.PositiveIntegerField()),
+                ("sizes", models.JSONField()),
+                ("text", models.BinaryField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Page index",
+                "verbose_name_plural": "Page indexes",
+                "db_table": "page_indexes",
+                "default_permissions": (),
+            },
+        ),
+    ]
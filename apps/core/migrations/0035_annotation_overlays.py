@@ -0,0 +1,90 @@
+import xml.etree.ElementTree as ET
+
+from django.db import migrations, models
+
+
+# Snapshot of apps.core.modifiers.pdf.annotations.compile_annotation at the time of this migration
+def parse_color(color: str) -> tuple:
+    if color.startswith("#") and len(color) == 7:
+        try:
+            return int(color[1:3], 16) / 255.0, int(color[3:5], 16) / 255.0, int(color[5:7], 16) / 255.0
+        except ValueError:
+            pass
+    return 0, 0, 0
+
+
+def compile_annotation(content: str) -> list[list]:
+    ops = []
+
+    for element in ET.fromstring(content):
+        tag = element.tag.split("}")[-1]
+        attrib = element.attrib
+
+        if tag == "line":
+            ops.append(
+                [
+                    "line",
+                    float(attrib.get("x1", 0)),
+                    float(attrib.get("y1", 0)),
+                    float(attrib.get("x2", 0)),
+                    float(attrib.get("y2", 0)),
+                    float(attrib.get("stroke-width", 1)),
+                ]
+            )
+        elif tag == "circle":
+            ops.append(
+                [
+                    "circle",
+                    float(attrib.get("cx", 0)),
+                    float(attrib.get("cy", 0)),
+                    float(attrib.get("r", 0)),
+                    parse_color(attrib.get("fill", "black")),
+                ]
+            )
+        elif tag == "rect":
+            ops.append(
+                [
+                    "rect",
+                    float(attrib.get("x", 0)),
+                    float(attrib.get("y", 0)),
+                    float(attrib.get("width", 0)),
+                    float(attrib.get("height", 0)),
+                    parse_color(attrib.get("fill", "black")),
+                ]
+            )
+
+    return ops
+
+
+def compile_items(apps, schema_editor):
+    AnnotationItem = apps.get_model("core", "AnnotationItem")
+    db_alias = schema_editor.connection.alias
+
+    for item in AnnotationItem.objects.using(db_alias).only("id", "content").iterator():
+        try:
+            ops = compile_annotation(item.content)
+        except (ET.ParseError, ValueError):
+            # Invalid items failed the download before, they are skipped now
+            ops = []
+        AnnotationItem.objects.using(db_alias).filter(pk=item.pk).update(ops=ops)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0034_page_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotationitem",
+            name="ops",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name="useracquisition",
+            name="overlay_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compile_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+import re
+
+from django.db import migrations
+
+import apps.core.fields.multirange
+from apps.core.fields.multirange import PageRanges, MAX_PAGE
+
+
+def legacy_ranges(value: str) -> PageRanges:
+    """
+    Ranges saved as text were not validated, parts which are not valid ranges are ignored (as they were before).
+    Ranges are clamped to the int4multirange bounds, pages above them do not exist anyway.
+    """
+    intervals = []
+
+    for part in value.split(","):
+        numbers = [int(number) for number in re.findall(r"[0-9]+", part)]
+        if len(numbers) == 1 and 1 <= numbers[0] <= MAX_PAGE:
+            intervals.append((numbers[0], numbers[0]))
+        elif len(numbers) == 2 and numbers[0] <= MAX_PAGE:
+            intervals.append((max(numbers[0], 1), min(numbers[1], MAX_PAGE)))
+
+    return PageRanges(intervals)
+
+
+def forwards_func(apps, schema_editor):
+    UserAcquisition = apps.get_model("core", "UserAcquisition")
+    db_alias = schema_editor.connection.alias
+
+    for user_acquisition in UserAcquisition.objects.using(db_alias).exclude(range__isnull=True).exclude(range=""):
+        user_acquisition.pages = legacy_ranges(user_acquisition.range) or None
+        user_acquisition.save(update_fields=["pages"])
+
+
+def reverse_func(apps, schema_editor):
+    UserAcquisition = apps.get_model("core", "UserAcquisition")
+    db_alias = schema_editor.connection.alias
+
+    for user_acquisition in UserAcquisition.objects.using(db_alias).exclude(pages__isnull=True):
+        user_acquisition.range = str(user_acquisition.pages)
+        user_acquisition.save(update_fields=["range"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0035_annotation_overlays"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="useracquisition",
+            name="pages",
+            field=apps.core.fields.multirange.MultiRangeField(null=True),
+        ),
+        migrations.RunPython(forwards_func, reverse_func),
+        migrations.RemoveField(
+            model_name="useracquisition",
+            name="range",
+        ),
+        migrations.RenameField(
+            model_name="useracquisition",
+            old_name="pages",
+            new_name="range",
+        ),
+    ]
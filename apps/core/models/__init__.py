@@ -6,9 +6,14 @@ from .currency import Currency
 from .language import Language
 from .category import Category
 from .entry import Entry
+from .entry_ranking import EntryRanking
+from .download_event import DownloadEvent
+from .download_statistic import DownloadStatistic
 from .price import Price
+from .blob import Blob
 from .author import Author
 from .acquisition import Acquisition
+from .page_index import PageIndex
 from .user_catalog import UserCatalog
 from .auth_source import AuthSource
 from .annotation import Annotation
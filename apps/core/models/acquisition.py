@@ -1,18 +1,21 @@
-import base64
 import hashlib
 from typing import Optional
 
 from celery import signature, chain, group
-from django.db import models
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from apps.core.models.blob import Blob
 from apps.core.models.entry import Entry
 from apps.core.models.base import BaseModel
-from apps.files.storage import get_storage
+from apps.files.storage import get_storage, checksum_cache_key
 
 
 class Acquisition(BaseModel):
@@ -52,6 +55,26 @@ class Acquisition(BaseModel):
     )
     mime = models.CharField(choices=AcquisitionMIME.choices, max_length=100)
     content = models.FileField(upload_to=upload_to_path, null=True, max_length=255, storage=get_storage)
+    # Content-addressed storage, content.name points to blob.content.name (null for legacy acquisitions)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, related_name="acquisitions")
+
+    def store_content(self, content: File, extension: Optional[str]):
+        """
+        Store content as a deduplicated blob. Reference of the blob is taken when the acquisition is saved.
+        """
+        self.blob = Blob.objects.store(content, extension)
+        self.content.name = self.blob.content.name
+        self._acquire_blob = True
+
+    def save(self, *args, **kwargs):
+        if not getattr(self, "_acquire_blob", False):
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            Blob.objects.acquire(self.blob)
+            super().save(*args, **kwargs)
+
+        self._acquire_blob = False
 
     @property
     def url(self) -> Optional[str]:
@@ -59,19 +82,25 @@ class Acquisition(BaseModel):
             return None
         return reverse("files:acquisition-download", kwargs={"acquisition_id": self.pk})
 
-    @property
-    def base64(self) -> Optional[str]:
-        if self.content is not None:
-            encoded = base64.b64encode(self.content.read()).decode("ascii")
-            return f"data:{self.mime};base64,{encoded}"
-        return None
-
     @property
     def checksum(self) -> Optional[str]:
-        if self.content is not None:
+        # Blob is keyed by the uploaded content, stored content may differ after post-processing (OCR)
+        if self.content:
+            cached = cache.get(checksum_cache_key(self.content.name))
+            if cached:
+                return cached
+
+            # Separate handle, the content itself may be read by the caller afterwards (e.g. modifiers)
             checksum = hashlib.sha256()
-            while block := self.content.read(4096):
-                checksum.update(block)
+            with self.content.storage.open(self.content.name, "rb") as f:
+                while block := f.read(64 * 1024):
+                    checksum.update(block)
+
+            cache.set(
+                checksum_cache_key(self.content.name),
+                checksum.hexdigest(),
+                settings.EVILFLOWERS_CACHE_SERVER_HASHES.total_seconds(),
+            )
             return checksum.hexdigest()
         return None
 
@@ -86,7 +115,8 @@ def touch_entry(sender, instance: Acquisition, **kwargs):
 def background_tasks(sender, instance: Acquisition, created: bool, **kwargs):
     dependent_tasks = []
 
-    if created and instance.entry.language_id:
+    # Deduplicated content was already processed when the blob was uploaded for the first time
+    if created and instance.entry.language_id and not (instance.blob and instance.blob.references > 1):
         ocr_task = signature(
             "evilflowers_ocr_worker.ocr",
             args=[instance.content.name, instance.content.name, instance.entry.language.alpha3],
@@ -111,10 +141,23 @@ def background_tasks(sender, instance: Acquisition, created: bool, **kwargs):
             )
         )
 
+    # Page index is built after OCR to include the recognized text layer
+    if created and instance.mime == Acquisition.AcquisitionMIME.PDF:
+        dependent_tasks.append(
+            signature("apps.tasks.tasks.index_acquisition", args=[str(instance.pk)], immutable=True)
+        )
+
     if ocr_task is not None:
-        chain(ocr_task, group(dependent_tasks)).apply_async()
+        refresh_task = signature("apps.tasks.tasks.refresh_checksum", args=[str(instance.pk)], immutable=True)
+        chain(ocr_task, refresh_task, group(dependent_tasks)).apply_async()
     else:
         group(dependent_tasks).apply_async()
 
 
+@receiver(post_delete, sender=Acquisition)
+def release_blob(sender, instance: Acquisition, **kwargs):
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
 __all__ = ["Acquisition"]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 from apps.core.models.base import BaseModel
 from django.utils.translation import gettext_lazy as _
@@ -16,3 +18,9 @@ class Annotation(BaseModel):
 
     title = models.CharField(max_length=255, default="Annotation")
     user_acquisition = models.ForeignKey(UserAcquisition, on_delete=models.CASCADE)
+
+
+@receiver(post_save, sender=Annotation)
+@receiver(post_delete, sender=Annotation)
+def invalidate_annotations(sender, instance: Annotation, **kwargs):
+    UserAcquisition.invalidate_annotations(instance.user_acquisition_id)
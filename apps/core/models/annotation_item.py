@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
 
 from apps.core.models.annotation import Annotation
 from apps.core.models.base import BaseModel
+from apps.core.models.user_acquisition import UserAcquisition
+from apps.core.modifiers.pdf.annotations import compile_annotation
 from django.utils.translation import gettext as _
 
 
@@ -16,3 +20,20 @@ class AnnotationItem(BaseModel):
     annotation = models.ForeignKey(Annotation, on_delete=models.CASCADE)
     page = models.PositiveSmallIntegerField()
     content = models.TextField()
+    # Drawing operations compiled from content (see apps.core.modifiers.pdf.annotations)
+    ops = models.JSONField(default=list)
+
+
+@receiver(pre_save, sender=AnnotationItem)
+def compile_content(sender, instance: AnnotationItem, **kwargs):
+    instance.ops = compile_annotation(instance.content)
+
+
+@receiver(post_save, sender=AnnotationItem)
+@receiver(post_delete, sender=AnnotationItem)
+def invalidate_annotations(sender, instance: AnnotationItem, **kwargs):
+    # Annotation may be already deleted (cascade), its own receiver takes care of it
+    for user_acquisition_id in Annotation.objects.filter(pk=instance.annotation_id).values_list(
+        "user_acquisition_id", flat=True
+    ):
+        UserAcquisition.invalidate_annotations(user_acquisition_id)
@@ -0,0 +1,29 @@
+from django.db import models
+from django.db.models.functions import Now
+from django.utils.translation import gettext_lazy as _
+
+from apps.core.managers.blob import BlobManager
+from apps.files.storage import get_storage
+
+
+class Blob(models.Model):
+    class Meta:
+        app_label = "core"
+        db_table = "blobs"
+        default_permissions = ()
+        verbose_name = _("Blob")
+        verbose_name_plural = _("Blobs")
+
+    def _upload_to_path(self, filename):
+        return f"blobs/{self.checksum[:2]}/{filename}"
+
+    checksum = models.CharField(max_length=64, primary_key=True)
+    content = models.FileField(upload_to=_upload_to_path, max_length=255, storage=get_storage)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(db_default=Now())
+
+    objects = BlobManager()
+
+
+__all__ = ["Blob"]
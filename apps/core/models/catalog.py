@@ -1,4 +1,11 @@
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from apps.core.models.base import BaseModel
@@ -12,6 +19,11 @@ class Catalog(BaseModel):
         verbose_name = _("Catalog")
         verbose_name_plural = _("Catalogs")
         unique_together = ("creator_id", "title")
+        indexes = [
+            models.Index(fields=["id"], condition=Q(is_public=True), name="catalogs_public_idx"),
+        ]
+
+    PUBLIC_IDS_CACHE_KEY = "catalogs:public"
 
     creator = models.ForeignKey("User", on_delete=models.CASCADE)
     url_name = models.SlugField(unique=True)
@@ -20,6 +32,28 @@ class Catalog(BaseModel):
     is_public = models.BooleanField(default=False)
     touched_at = models.DateTimeField(null=True, auto_now=True)
 
+    @classmethod
+    def public_ids(cls) -> list[UUID]:
+        return cache.get_or_set(
+            cls.PUBLIC_IDS_CACHE_KEY,
+            lambda: list(cls.objects.filter(is_public=True).values_list("id", flat=True)),
+            settings.EVILFLOWERS_CACHE_SERVER_PERMISSIONS.total_seconds(),
+        )
+
+
+@receiver(post_save, sender=Catalog)
+def invalidate_public_ids(sender, instance: Catalog, **kwargs):
+    # Catalog is saved on every touch, invalidate only if the visibility really changed
+    public_ids = cache.get(Catalog.PUBLIC_IDS_CACHE_KEY)
+    if public_ids is not None and (instance.pk in public_ids) != instance.is_public:
+        cache.delete(Catalog.PUBLIC_IDS_CACHE_KEY)
+
+
+@receiver(post_delete, sender=Catalog)
+def invalidate_deleted_public_ids(sender, instance: Catalog, **kwargs):
+    if instance.is_public:
+        cache.delete(Catalog.PUBLIC_IDS_CACHE_KEY)
+
 
 __all__ = [
     "Catalog",
@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class DownloadEvent(models.Model):
+    """
+    Append-only download log written by apps.core.analytics.ingest() using COPY. The table is partitioned by month
+    of created_at (download_events_YYYY_MM) and is not managed by Django, partitions are created on demand.
+    There are no foreign keys, events are kept after the related objects are deleted.
+    """
+
+    class Meta:
+        app_label = "core"
+        db_table = "download_events"
+        managed = False
+        default_permissions = ()
+        verbose_name = _("Download event")
+        verbose_name_plural = _("Download events")
+
+    id = models.UUIDField(primary_key=True)
+    created_at = models.DateTimeField()
+    acquisition_id = models.UUIDField()
+    entry_id = models.UUIDField()
+    catalog_id = models.UUIDField()
+    user_id = models.UUIDField(null=True)
+    user_acquisition_id = models.UUIDField(null=True)
+
+
+__all__ = ["DownloadEvent"]
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.core.models.catalog import Catalog
+from apps.core.models.entry import Entry
+
+
+class DownloadStatistic(models.Model):
+    """
+    Daily rollup of DownloadEvent per entry maintained by apps.core.analytics.rollup(). Per-catalog statistics are
+    sums over catalog_id.
+    """
+
+    class Meta:
+        app_label = "core"
+        db_table = "download_statistics"
+        default_permissions = ()
+        verbose_name = _("Download statistic")
+        verbose_name_plural = _("Download statistics")
+        constraints = [
+            models.UniqueConstraint(fields=["date", "entry"], name="download_statistics_date_entry_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["catalog_id", "date"], name="download_statistics_catalog_idx"),
+        ]
+
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateField()
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name="download_statistics")
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, related_name="download_statistics")
+    downloads = models.PositiveIntegerField(default=0)
+    users = models.PositiveIntegerField(default=0)
+
+
+__all__ = ["DownloadStatistic"]
@@ -1,3 +1,4 @@
+import hashlib
 from typing import Optional, TypedDict, Literal
 
 from django.conf import settings
@@ -29,6 +30,7 @@ class EntryConfig(TypedDict):
     evilflowers_render_type: Literal["page", "document"]
     evilflowers_share_enabled: bool
     evilflowers_metadata_fetch: bool
+    evilflowers_pdf_profile: Optional[Literal["fast", "balanced", "archival"]]
     readium_enabled: bool
 
 
@@ -41,6 +43,7 @@ def default_entry_config() -> EntryConfig:
         evilflowers_share_enabled=True,
         evilflowers_render_type="document",
         evilflowers_metadata_fetch=False,
+        evilflowers_pdf_profile=None,
         readium_enabled=False,
     )
 
@@ -86,17 +89,28 @@ class Entry(BaseModel):
     citation = models.TextField(null=True)
     touched_at = models.DateTimeField(null=True, auto_now=True)
 
+    @staticmethod
+    def file_version(file) -> str:
+        """
+        Version of the image used in immutable URLs. Uploads never overwrite existing files (storage assigns unique
+        names), so the file name identifies the content.
+        """
+        return hashlib.sha256(file.name.encode()).hexdigest()[:16]
+
     @property
     def image_url(self) -> Optional[str]:
         if not self.image:
             return None
-        return reverse("files:cover-download", kwargs={"entry_id": self.pk})
+        return f"{reverse('files:cover-download', kwargs={'entry_id': self.pk})}?v={self.file_version(self.image)}"
 
     @property
     def thumbnail_url(self) -> Optional[str]:
-        if not self.image:
+        if not self.thumbnail:
             return None
-        return reverse("files:thumbnail-download", kwargs={"entry_id": self.pk})
+        return (
+            f"{reverse('files:thumbnail-download', kwargs={'entry_id': self.pk})}"
+            f"?v={self.file_version(self.thumbnail)}"
+        )
 
     def read_config(self, config_name: str):
         current = default_entry_config() | self.config
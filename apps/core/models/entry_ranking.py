@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.core.models.catalog import Catalog
+from apps.core.models.entry import Entry
+
+
+class EntryRanking(models.Model):
+    """
+    Time-decayed popularity of the entry maintained by apps.core.popularity.flush(). Score is a logarithm of the sum
+    of downloads weighted by exp(λ * (t - POPULARITY_EPOCH)), so scores of all entries decay at the same rate and
+    only entries with new downloads have to be updated. Compare scores only with each other.
+    """
+
+    class Meta:
+        app_label = "core"
+        db_table = "entry_rankings"
+        default_permissions = ()
+        verbose_name = _("Entry ranking")
+        verbose_name_plural = _("Entry rankings")
+        indexes = [
+            models.Index(fields=["catalog_id", "-score"], name="entry_rankings_top_idx"),
+        ]
+
+    entry = models.OneToOneField(Entry, on_delete=models.CASCADE, primary_key=True, related_name="ranking")
+    catalog = models.ForeignKey(Catalog, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+__all__ = ["EntryRanking"]
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from apps.core.managers.page_index import PageIndexManager
+from apps.core.models.acquisition import Acquisition
+
+
+class PageIndex(models.Model):
+    """
+    Page count, page sizes and text layer of the PDF acquisition built by apps.tasks.tasks.index_acquisition, so
+    page ranges and viewer layout do not have to open the document. Sizes are run-length encoded ([width, height,
+    count] in points), text layer is zlib compressed UTF-8 with pages separated by form feed.
+    """
+
+    class Meta:
+        app_label = "core"
+        db_table = "page_indexes"
+        default_permissions = ()
+        verbose_name = _("Page index")
+        verbose_name_plural = _("Page indexes")
+
+    PAGE_SEPARATOR = "\f"
+
+    acquisition = models.OneToOneField(
+        Acquisition, on_delete=models.CASCADE, primary_key=True, related_name="page_index"
+    )
+    page_count = models.PositiveIntegerField()
+    sizes = models.JSONField()
+    text = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PageIndexManager()
+
+
+__all__ = ["PageIndex"]
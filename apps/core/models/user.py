@@ -3,10 +3,13 @@ from uuid import UUID
 
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 from apps.core.managers.user import UserManager
 from apps.core.models.auth_source import AuthSource
+from apps.core.models.catalog import Catalog
 
 from apps.core.models.base import BaseModel
 
@@ -40,14 +43,35 @@ class User(BaseModel, AbstractBaseUser, PermissionsMixin):
     def permissions(self) -> List[str]:
         return self.get_user_permissions()
 
+    @staticmethod
+    def catalog_permissions_key(user_id: UUID) -> str:
+        return f"catalog_permissions:{user_id}"
+
     @property
     def catalog_permissions(self) -> dict[UUID, str]:
-        result = {}
-
-        for user_catalog in self.user_catalogs.all():
-            result[user_catalog.catalog_id] = user_catalog.mode
+        """
+        Catalog to mode map of the user. Loaded once per instance (so once per request for request.user) and shared
+        across processes using cache. Cache is invalidated on every UserCatalog change.
+        """
+        if not hasattr(self, "_catalog_permissions"):
+            self._catalog_permissions = cache.get_or_set(
+                self.catalog_permissions_key(self.pk),
+                lambda: dict(self.user_catalogs.values_list("catalog_id", "mode")),
+                settings.EVILFLOWERS_CACHE_SERVER_PERMISSIONS.total_seconds(),
+            )
+
+        return self._catalog_permissions
 
-        return result
+    @property
+    def accessible_catalog_ids(self) -> list[UUID]:
+        """
+        Identifiers of all catalogs the user can read (assigned and public ones). Intended to be used with
+        `catalog_id__any` lookup instead of joining user_catalogs in visibility rules.
+        """
+        if not hasattr(self, "_accessible_catalog_ids"):
+            self._accessible_catalog_ids = list(set(self.catalog_permissions.keys()) | set(Catalog.public_ids()))
+
+        return self._accessible_catalog_ids
 
 
 __all__ = ["User"]
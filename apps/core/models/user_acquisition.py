@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import F
 from django.urls import reverse
 
+from apps.core.fields.multirange import MultiRangeField
 from apps.core.models import Entry
 from apps.core.models.acquisition import Acquisition
 from apps.core.models.user import User
@@ -27,8 +29,14 @@ class UserAcquisition(BaseModel):
         choices=UserAcquisitionType.choices,
         default=UserAcquisitionType.PERSONAL,
     )
-    range = models.CharField(max_length=100, null=True)
+    range = MultiRangeField(null=True)
     expire_at = models.DateTimeField(null=True)
+    # Incremented whenever annotations of the user acquisition change (used in modifier cache keys)
+    overlay_version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def invalidate_annotations(cls, user_acquisition_id):
+        cls.objects.filter(pk=user_acquisition_id).update(overlay_version=F("overlay_version") + 1)
 
     @property
     def url(self) -> str:
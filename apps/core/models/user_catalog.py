@@ -1,6 +1,11 @@
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext as _
 
+from apps.core.models.user import User
+
 
 class UserCatalog(models.Model):
     class Meta:
@@ -18,3 +23,9 @@ class UserCatalog(models.Model):
     user = models.ForeignKey("User", on_delete=models.CASCADE, related_name="user_catalogs")
     catalog = models.ForeignKey("Catalog", on_delete=models.CASCADE, related_name="user_catalogs")
     mode = models.CharField(max_length=10, choices=Mode.choices)
+
+
+@receiver(post_save, sender=UserCatalog)
+@receiver(post_delete, sender=UserCatalog)
+def invalidate_catalog_permissions(sender, instance: UserCatalog, **kwargs):
+    cache.delete(User.catalog_permissions_key(instance.user_id))
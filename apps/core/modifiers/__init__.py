@@ -1,6 +1,11 @@
+from functools import lru_cache
 from typing import TypedDict, Optional
 from uuid import UUID
 
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import Template
+from django.template.loader import get_template
+
 
 class ModifierContext(TypedDict):
     id: Optional[UUID]
@@ -20,3 +25,26 @@ class ModifierException(Exception):
 
 class InvalidPage(ModifierException):
     pass
+
+
+class ModifierBusy(ModifierException):
+    pass
+
+
+class ModifierTimeout(ModifierException):
+    pass
+
+
+class InvalidDocument(ModifierException):
+    pass
+
+
+@lru_cache(maxsize=32)
+def license_template(language: Optional[str]) -> Template:
+    """
+    Compiled license template for the language, falling back to the default one if there is none.
+    """
+    try:
+        return get_template(f"files/license_{language}.html")
+    except TemplateDoesNotExist:
+        return get_template("files/license.txt")
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+
+from apps.files.storage import schedule_eviction
+
+
+class ModifierCache:
+    """
+    Local disk cache of generated (personalized) modifier outputs with size-bounded LRU eviction
+    (EVILFLOWERS_MODIFIERS_CACHE_DATADIR, EVILFLOWERS_MODIFIERS_CACHE_MAX_SIZE). Keys contain everything the output
+    depends on, entries are never invalidated explicitly, stale ones are evicted. Other directory and size can be
+    used for other generated content (e.g. rendered pages). Eviction runs in the background.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: Optional[int] = None):
+        self._directory = Path(directory or settings.EVILFLOWERS_MODIFIERS_CACHE_DATADIR)
+        self._max_size = settings.EVILFLOWERS_MODIFIERS_CACHE_MAX_SIZE if max_size is None else max_size
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_size > 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self._directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[File]:
+        """
+        Opened cached output or None. Output is opened before it is touched, so a concurrent eviction can not remove it
+        in between.
+        """
+        path = self._path(key)
+
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        os.utime(f.fileno())
+        return File(f, name=path.name)
+
+    def set(self, key: str, content: File) -> File:
+        path = self._path(key)
+        os.makedirs(path.parent, exist_ok=True)
+
+        content.seek(0)
+        with tempfile.NamedTemporaryFile("wb", dir=path.parent, suffix=".tmp", delete=False) as f:
+            try:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+
+        os.replace(f.name, path)
+        schedule_eviction(self._directory, self._max_size)
+
+        content.seek(0)
+        return content
+
+
+__all__ = ["ModifierCache"]
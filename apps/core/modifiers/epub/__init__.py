@@ -0,0 +1,269 @@
+import copy
+import posixpath
+import re
+import shutil
+import struct
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+from html import escape, unescape
+from html.parser import HTMLParser
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from apps.core.fields.multirange import PageRanges
+from apps.core.modifiers import ModifierContext, InvalidDocument, InvalidPage, license_template
+
+LICENSE_ID = "evilflowers-license"
+LICENSE_FILENAME = "evilflowers-license.xhtml"
+
+CONTAINER_NS = {"container": "urn:oasis:names:tc:opendocument:xmlns:container"}
+
+
+class XHTMLWriter(HTMLParser):
+    """
+    Serialize (possibly not well-formed) HTML as XHTML body content: void elements are self-closed, unclosed
+    elements are closed, document structure (html, head, body) is unwrapped and the head is dropped.
+    """
+
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+    # Elements with optional end tags closed by the start of the same (or block) element
+    IMPLIED_END = {"li", "dt", "dd", "tr", "td", "th", "option", "p"}
+    BLOCK = {
+        "address",
+        "blockquote",
+        "div",
+        "dl",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "hr",
+        "ol",
+        "pre",
+        "table",
+        "ul",
+    }
+    UNWRAPPED = {"html", "body"}
+    DROPPED = {"head", "script", "style", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._output = []
+        self._stack = []
+        self._dropped = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.DROPPED:
+            self._dropped += 1
+            return
+        if self._dropped or tag in self.UNWRAPPED:
+            return
+
+        if self._stack and self._stack[-1] in self.IMPLIED_END:
+            if tag == self._stack[-1] or (self._stack[-1] == "p" and tag in self.BLOCK):
+                self.handle_endtag(self._stack[-1])
+
+        attributes = "".join(f' {name}="{escape(value if value is not None else name)}"' for name, value in attrs)
+
+        if tag in self.VOID:
+            self._output.append(f"<{tag}{attributes}/>")
+        else:
+            self._output.append(f"<{tag}{attributes}>")
+            self._stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID and self._stack and self._stack[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.DROPPED:
+            self._dropped = max(self._dropped - 1, 0)
+            return
+        if self._dropped or tag not in self._stack:
+            return
+
+        while self._stack:
+            current = self._stack.pop()
+            self._output.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._dropped:
+            self._output.append(escape(data, quote=False))
+
+    def render(self, content: str) -> str:
+        self.feed(content)
+        self.close()
+        return "".join(self._output) + "".join(f"</{tag}>" for tag in reversed(self._stack))
+
+
+class EPUBModifier:
+    """
+    Personalized EPUB: license page (second in the reading order) and metadata of the user are injected into the
+    package document. The container is rewritten as a stream, members other than the package document are copied
+    with their original compressed bytes, so the cost is a single pass over the file with constant memory.
+    EPUB has no fixed pages, page ranges, single pages and annotations are not supported.
+    """
+
+    DEFAULT_CONTEXT: ModifierContext = {
+        "generated_at": timezone.now().isoformat(),
+        "instance": settings.INSTANCE_NAME,
+    }
+
+    def __init__(self, context: ModifierContext, pages: Optional[PageRanges]):
+        self._context = self.DEFAULT_CONTEXT | context
+
+    def _render_license(self) -> bytes:
+        template = license_template(self._context.get("language"))
+        content = template.render(self._context)
+
+        if template.origin.template_name.endswith(".html"):
+            body = XHTMLWriter().render(content)
+        else:
+            # Variables are escaped by the template engine already, literal text of the template may not be
+            body = f"<pre>{escape(unescape(content))}</pre>"
+
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+            f"<head><title>{escape(self._context.get('title') or '')}</title></head>\n"
+            f"<body>{body}</body>\n"
+            "</html>\n"
+        ).encode()
+
+    def _rewrite_package(self, content: bytes) -> bytes:
+        """
+        Add the license page to the manifest and the spine and the user to the metadata. Package document is edited
+        as text to keep its namespace prefixes and formatting intact.
+        """
+        text = content.decode("utf-8")
+
+        def insert_before(pattern: str, build) -> str:
+            match = re.search(pattern, text)
+            if not match:
+                raise InvalidDocument("Invalid EPUB package document")
+            return text[: match.start()] + build(match.group(1) or "") + text[match.start() :]
+
+        text = insert_before(
+            r"</(\w+:)?metadata\s*>",
+            lambda prefix: (
+                f'<{prefix}meta name="evilflowers:id" content="{escape(str(self._context["id"]))}"/>'
+                f'<{prefix}meta name="evilflowers:user" '
+                f'content="{escape(self._context["username"])} ({escape(str(self._context["user_id"]))})"/>'
+                f'<{prefix}meta name="evilflowers:generator" content="EvilFlowers/{escape(settings.INSTANCE_NAME)}"/>'
+            ),
+        )
+        text = insert_before(
+            r"</(\w+:)?manifest\s*>",
+            lambda prefix: (
+                f'<{prefix}item id="{LICENSE_ID}" href="{LICENSE_FILENAME}" media-type="application/xhtml+xml"/>'
+            ),
+        )
+
+        # License follows the first item of the reading order (usually the cover), as in PDF
+        itemref = re.search(r"<(\w+:)?itemref\b[^>]*>", text)
+        if itemref:
+            prefix = itemref.group(1) or ""
+            position = itemref.end()
+            if not itemref.group(0).endswith("/>"):
+                position = re.compile(rf"</{prefix}itemref\s*>").search(text, position).end()
+        else:
+            spine = re.search(r"<(\w+:)?spine\b[^>]*>", text)
+            if not spine or spine.group(0).endswith("/>"):
+                raise InvalidDocument("Invalid EPUB package document")
+            position = spine.end()
+            prefix = spine.group(1) or ""
+
+        return (text[:position] + f'<{prefix}itemref idref="{LICENSE_ID}"/>' + text[position:]).encode("utf-8")
+
+    @staticmethod
+    def _copy_raw(source, output, info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+        """
+        Copy the member without decompression: new local header (without data descriptor, sizes and CRC are known
+        from the central directory) followed by the original compressed data.
+        """
+        source.seek(info.header_offset)
+        header = source.read(30)
+        filename_length, extra_length = struct.unpack("<HH", header[26:30])
+        source.seek(info.header_offset + 30 + filename_length + extra_length)
+
+        copied = copy.copy(info)
+        copied.flag_bits &= ~0x08
+        copied.header_offset = output.tell()
+        output.write(copied.FileHeader())
+
+        remaining = info.compress_size
+        while remaining:
+            chunk = source.read(min(remaining, 64 * 1024))
+            if not chunk:
+                raise InvalidDocument("Truncated EPUB container")
+            output.write(chunk)
+            remaining -= len(chunk)
+
+        return copied
+
+    def generate(
+        self,
+        file: File,
+        page_num: Optional[int] = None,
+        annotation_map: dict[int, list[list]] = None,
+        profile: Optional[str] = None,
+    ) -> File:
+        if page_num:
+            raise InvalidPage()
+
+        # Members are read by offsets from the central directory, stream has to be seekable
+        source = tempfile.TemporaryFile()
+        shutil.copyfileobj(file, source, 64 * 1024)
+        source.seek(0)
+
+        try:
+            archive = zipfile.ZipFile(source)
+            container = ET.fromstring(archive.read("META-INF/container.xml"))
+        except (zipfile.BadZipFile, KeyError, ET.ParseError, zlib.error, NotImplementedError) as e:
+            raise InvalidDocument("Invalid EPUB container") from e
+
+        rootfile = container.find("container:rootfiles/container:rootfile", CONTAINER_NS)
+        if rootfile is None or rootfile.get("full-path") not in archive.NameToInfo:
+            raise InvalidDocument("Invalid EPUB container")
+
+        package_path = rootfile.get("full-path")
+
+        try:
+            package = self._rewrite_package(archive.read(package_path))
+        except (zipfile.BadZipFile, zlib.error, NotImplementedError, UnicodeDecodeError) as e:
+            raise InvalidDocument("Invalid EPUB package document") from e
+
+        license_path = posixpath.join(posixpath.dirname(package_path), LICENSE_FILENAME)
+        output = tempfile.TemporaryFile()
+
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as result:
+            for info in archive.infolist():
+                if info.filename in (package_path, license_path):
+                    continue
+                # ZipFile has no API for raw copies, copied members are registered in its central directory
+                copied = self._copy_raw(source, output, info)
+                result.filelist.append(copied)
+                result.NameToInfo[copied.filename] = copied
+                result.start_dir = output.tell()
+
+            result.writestr(package_path, package)
+            result.writestr(license_path, self._render_license())
+
+        archive.close()
+        source.close()
+        output.seek(0)
+
+        return File(output)
+
+
+__all__ = ["EPUBModifier"]
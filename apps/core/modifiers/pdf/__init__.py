@@ -1,18 +1,72 @@
 import io
 import json
-from typing import Optional, List
+import math
+from functools import lru_cache
+from typing import Optional
 
 import fitz
 import qrcode
 from django.conf import settings
 from django.core.files import File
-from django.template import TemplateDoesNotExist
-from django.template.loader import get_template
 from django.utils import timezone
-import xml.etree.ElementTree as ET
 
-from apps.core.modifiers import ModifierContext, InvalidPage
-from apps.core.modifiers.pdf.annotations import shape_factory
+from apps.core.fields.multirange import PageRanges
+from apps.core.modifiers import ModifierContext, InvalidPage, license_template
+from apps.core.modifiers.pdf.annotations import draw_annotation
+
+QR_RESOURCE_NAME = "EvilFlowersQR"
+
+# Output profiles (arguments of fitz.Document.tobytes()):
+# - fast: no garbage collection (forced if the output is restricted by the page range)
+# - balanced: unused objects are removed, duplicate objects merged, images compressed, output is linearized
+# - archival: balanced with cleaned content streams and compressed fonts
+PROFILES = {
+    "fast": {"deflate": True},
+    "balanced": {"garbage": 3, "deflate": True, "deflate_images": True, "linear": True},
+    "archival": {
+        "garbage": 4,
+        "clean": True,
+        "deflate": True,
+        "deflate_images": True,
+        "deflate_fonts": True,
+        "linear": True,
+    },
+}
+
+
+@lru_cache(maxsize=256)
+def render_qr(data: str) -> bytes:
+    qr = qrcode.QRCode(version=4, border=0, error_correction=qrcode.constants.ERROR_CORRECT_H)
+    qr.add_data(data)
+    qr = qr.make_image().get_image().convert("RGBA")
+    qr.putalpha(150)
+
+    stream = io.BytesIO()
+    qr.save(stream, format="PNG")
+
+    return stream.getvalue()
+
+
+def render_page(file: File, page: int, dpi: int, image_format: str) -> bytes:
+    """
+    Render the page (numbered from 1) of the PDF document as a PNG or WebP image in the resolution. Resolution of
+    large pages is reduced to keep the image under EVILFLOWERS_RENDER_MAX_PIXELS.
+    """
+    with fitz.open(stream=file.read(), filetype="pdf") as document:
+        if not 1 <= page <= len(document):
+            raise InvalidPage()
+
+        rect = document[page - 1].rect
+        area = max(rect.width * rect.height, 1) / 72**2
+        dpi = max(min(dpi, math.floor(math.sqrt(settings.EVILFLOWERS_RENDER_MAX_PIXELS / area))), 1)
+
+        pixmap = document[page - 1].get_pixmap(dpi=dpi)
+
+    # PyMuPDF does not write WebP itself
+    if image_format == "webp":
+        return pixmap.pil_tobytes(format="WEBP")
+
+    return pixmap.tobytes("png")
 
 
 class PDFModifier:
@@ -21,31 +75,37 @@ class PDFModifier:
         "instance": settings.INSTANCE_NAME,
     }
 
-    def __init__(self, context: ModifierContext, pages: Optional[List]):
+    def __init__(self, context: ModifierContext, pages: Optional[PageRanges]):
         self._context = self.DEFAULT_CONTEXT | context
         self._pages = pages or None
 
-    def create_qr(self) -> bytes:
-        qr = qrcode.QRCode(version=4, border=0, error_correction=qrcode.constants.ERROR_CORRECT_H)
-        qr.add_data(json.dumps(self._context))
-        qr = qr.make_image().get_image().convert("RGBA")
-        qr.putalpha(150)
-
-        stream = io.BytesIO()
-        qr.save(stream, format="PNG")
+    def _selected(self, document: fitz.Document) -> PageRanges:
+        """
+        Pages of the document (numbered from 1) included in the output, pages of the range outside of the document
+        are ignored.
+        """
+        pages = PageRanges([(1, len(document))])
+        return pages & self._pages if self._pages else pages
 
-        return stream.getvalue()
-
-    def generate(
-        self, file: File, page_num: Optional[int] = None, annotation_map: dict[int, list[str]] = None
-    ) -> File:
-        document = fitz.open(stream=file.read())
+    def create_qr(self) -> bytes:
+        return render_qr(json.dumps(self._context))
 
-        if not annotation_map:
-            annotation_map = {}
+    def _render_license(self, document: fitz.Document, index: int):
+        # Render the chosen template with the provided context data
+        document.insert_page(
+            index,
+            text=license_template(self._context.get("language")).render(self._context),
+            fontsize=11,
+            width=595,
+            height=842,
+            fontname="Helvetica",  # default font
+            fontfile=None,  # any font file name
+            color=(0, 0, 0),
+        )  # text color (RGB)
 
+    def _set_metadata(self, document: fitz.Document, metadata: dict):
         document.set_metadata(
-            document.metadata
+            metadata
             | {
                 "author": self._context["authors"],
                 "title": self._context["title"],
@@ -54,54 +114,114 @@ class PDFModifier:
             }
         )
 
+    @staticmethod
+    def _stamp(page: fitz.Page, qr: bytes, annotations: list[list], xref: int = 0) -> int:
+        """
+        Stamp the QR code and annotations (compiled drawing operations) on the page. QR image is embedded only once,
+        pages of the same document reference it by xref returned from the first call.
+        """
+        rect = fitz.Rect(10, page.mediabox.y1 - 50, 50, page.mediabox.y1 - 10)
+
+        # Page.insert_image() looks up a free resource name on every call. Pages sharing one resource dictionary then
+        # get a new name each, so the dictionary and the lookup grow with every page (quadratic stamping). Fixed name
+        # keeps a single entry pointing to the single embedded image. Page._insert_image() is private, PyMuPDF is
+        # pinned to the release series it was checked against (pyproject.toml).
+        page.wrap_contents()
+        xref, _ = page._insert_image(
+            stream=None if xref else qr,
+            clip=rect * ~page.transformation_matrix,
+            overlay=True,
+            xref=xref,
+            _imgname=QR_RESOURCE_NAME,
+            digests={},
+        )
+
+        if annotations:
+            context = page.new_shape()
+            draw_annotation(annotations, context)
+            context.commit()
+
+        return xref
+
+    def generate(
+        self,
+        file: File,
+        page_num: Optional[int] = None,
+        annotation_map: dict[int, list[list]] = None,
+        profile: Optional[str] = None,
+    ) -> File:
+        """
+        Generate the personalized document (or its single page). Output profile defaults to
+        EVILFLOWERS_MODIFIERS_PROFILE_PAGE for pages and EVILFLOWERS_MODIFIERS_PROFILE_DOCUMENT for documents.
+        """
+        document = fitz.open(stream=file.read())
+
+        if not annotation_map:
+            annotation_map = {}
+
+        if page_num:
+            return self._generate_page(
+                document, page_num, annotation_map, PROFILES[profile or settings.EVILFLOWERS_MODIFIERS_PROFILE_PAGE]
+            )
+
+        self._set_metadata(document, document.metadata)
+
         if self._pages:
-            document.select([i - 1 for i in self._pages])
+            selected = self._selected(document)
 
-        # Attempt to load the language-specific template, falling back to default if not found
-        try:
-            chosen_template = get_template(f"files/license_{self._context['language']}.html")
-        except TemplateDoesNotExist:
-            chosen_template = get_template("files/license.txt")
+            if not selected:
+                raise InvalidPage()
 
-        # Render the chosen template with the provided context data
-        document.insert_page(
-            1,
-            text=chosen_template.render(self._context),
-            fontsize=11,
-            width=595,
-            height=842,
-            fontname="Helvetica",  # default font
-            fontfile=None,  # any font file name
-            color=(0, 0, 0),
-        )  # text color (RGB)
+            document.select([i - 1 for i in selected])
+
+        self._render_license(document, 1)
 
         # Add QR codes to rest of pages
         qr = self.create_qr()
 
+        xref = 0
         for index in range(2, len(document)):
-            page = document[index]
+            # annotation map is indexing pages from 1 and generated document is larger by license page
+            xref = self._stamp(document[index], qr, annotation_map.get(index - 1, []), xref)
 
-            page.insert_image(
-                fitz.Rect(10, page.mediabox.y1 - 50, 50, page.mediabox.y1 - 10),
-                stream=io.BytesIO(qr),
-            )
+        options = PROFILES[profile or settings.EVILFLOWERS_MODIFIERS_PROFILE_DOCUMENT]
 
-            # annotation map is indexing pages from 1 and generated document is larger by license page
-            page_annotations = annotation_map.get(index - 1, [])
-            if page_annotations:
-                context = page.new_shape()
+        # Document.select() only unlinks the pages, without garbage collection their content would stay in the output
+        if self._pages:
+            options = options | {"garbage": max(options.get("garbage", 0), 1)}
 
-                for page_annotation in page_annotations:
-                    for element in ET.fromstring(page_annotation):
-                        shape = shape_factory(element)
-                        shape.draw(element, context)
+        return File(io.BytesIO(document.tobytes(**options)))
 
-                context.commit()
+    def _generate_page(
+        self, source: fitz.Document, page_num, annotation_map: dict[int, list[list]], options: dict
+    ) -> File:
+        """
+        Single page of the document generated by generate() without building the whole document: only the requested
+        page is copied into a new document and stamped. Cost does not depend on the number of pages.
+        """
+        try:
+            index = int(page_num) - 1
+        except ValueError:
+            raise InvalidPage()
 
-        if page_num:
-            try:
-                document.select([int(page_num) - 1])
-            except ValueError:
-                raise InvalidPage()
+        # Generated document consists of the first selected page, license page and the rest of selected pages
+        selected = self._selected(source)
+
+        position = index if index == 0 else index - 1
+
+        if index < 0 or (index != 1 and position >= len(selected)):
+            raise InvalidPage()
+
+        document = fitz.open()
+        self._set_metadata(document, source.metadata)
+
+        if index == 1:
+            self._render_license(document, 0)
+        else:
+            source_index = selected[position] - 1
+            document.insert_pdf(source, from_page=source_index, to_page=source_index)
+
+            if index >= 2:
+                self._stamp(document[0], self.create_qr(), annotation_map.get(index - 1, []))
 
-        return File(io.BytesIO(document.tobytes(garbage=3, deflate=True, deflate_images=True, linear=True)))
+        return File(io.BytesIO(document.tobytes(**options)))
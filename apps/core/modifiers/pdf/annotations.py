@@ -1,7 +1,13 @@
+import xml.etree.ElementTree as ET
+from typing import Optional
+
 import fitz
 
 
 class Shape:
+    """Base class for all shapes."""
+
+    name: Optional[str] = None
 
     @staticmethod
     def parse_color(color):
@@ -21,20 +27,30 @@ class Shape:
         # Default to black if color parsing fails
         return (0, 0, 0)
 
-    """Base class for all shapes."""
+    def compile(self, element) -> Optional[list]:
+        """Compile the SVG element into a drawing operation. Default: nothing to draw."""
+        return None
 
-    def draw(self, element, shape_context):
-        """Draw the shape on the page. Default: do nothing."""
+    def draw(self, op: list, shape_context):
+        """Draw the compiled operation on the page. Default: do nothing."""
         pass
 
 
 class LineShape(Shape):
-    def draw(self, element, shape_context):
-        x1 = float(element.attrib.get("x1", 0))
-        y1 = float(element.attrib.get("y1", 0))
-        x2 = float(element.attrib.get("x2", 0))
-        y2 = float(element.attrib.get("y2", 0))
-        stroke_width = float(element.attrib.get("stroke-width", 1))
+    name = "line"
+
+    def compile(self, element) -> list:
+        return [
+            self.name,
+            float(element.attrib.get("x1", 0)),
+            float(element.attrib.get("y1", 0)),
+            float(element.attrib.get("x2", 0)),
+            float(element.attrib.get("y2", 0)),
+            float(element.attrib.get("stroke-width", 1)),
+        ]
+
+    def draw(self, op: list, shape_context):
+        _, x1, y1, x2, y2, stroke_width = op
         color = (0, 0, 1)  # Default to blue
 
         shape_context.draw_line((x1, y1), (x2, y2))
@@ -42,39 +58,69 @@ class LineShape(Shape):
 
 
 class CircleShape(Shape):
-    def draw(self, element, shape_context):
-        cx = float(element.attrib.get("cx", 0))
-        cy = float(element.attrib.get("cy", 0))
-        r = float(element.attrib.get("r", 0))
-        fill = element.attrib.get("fill", "black")
-        color = self.parse_color(fill)
+    name = "circle"
+
+    def compile(self, element) -> list:
+        return [
+            self.name,
+            float(element.attrib.get("cx", 0)),
+            float(element.attrib.get("cy", 0)),
+            float(element.attrib.get("r", 0)),
+            self.parse_color(element.attrib.get("fill", "black")),
+        ]
+
+    def draw(self, op: list, shape_context):
+        _, cx, cy, r, color = op
 
         shape_context.draw_circle((cx, cy), r)
         shape_context.finish(color=color)
 
 
 class RectangleShape(Shape):
-    def draw(self, element, shape_context):
-        x = float(element.attrib.get("x", 0))
-        y = float(element.attrib.get("y", 0))
-        width = float(element.attrib.get("width", 0))
-        height = float(element.attrib.get("height", 0))
-        fill = element.attrib.get("fill", "black")
-        color = self.parse_color(fill)
+    name = "rect"
+
+    def compile(self, element) -> list:
+        return [
+            self.name,
+            float(element.attrib.get("x", 0)),
+            float(element.attrib.get("y", 0)),
+            float(element.attrib.get("width", 0)),
+            float(element.attrib.get("height", 0)),
+            self.parse_color(element.attrib.get("fill", "black")),
+        ]
+
+    def draw(self, op: list, shape_context):
+        _, x, y, width, height, color = op
 
         rect = fitz.Rect(x, y, x + width, y + height)
         shape_context.draw_rect(rect)
         shape_context.finish(color=color)
 
 
+SHAPES = {shape.name: shape for shape in (LineShape(), CircleShape(), RectangleShape())}
+
+
 def shape_factory(element):
     """Factory to create appropriate shape object based on SVG element."""
     tag = element.tag.split("}")[-1]  # Handle namespaced tags
-    if tag == "line":
-        return LineShape()
-    elif tag == "circle":
-        return CircleShape()
-    elif tag == "rect":
-        return RectangleShape()
-    else:
-        return Shape()
+    return SHAPES.get(tag, Shape())
+
+
+def compile_annotation(content: str) -> list[list]:
+    """
+    Compile SVG content of the annotation item into a list of drawing operations replayed by draw_annotation().
+    Raises ET.ParseError or ValueError if the content is not valid.
+    """
+    ops = []
+
+    for element in ET.fromstring(content):
+        op = shape_factory(element).compile(element)
+        if op is not None:
+            ops.append(op)
+
+    return ops
+
+
+def draw_annotation(ops: list[list], shape_context):
+    for op in ops:
+        SHAPES[op[0]].draw(op, shape_context)
@@ -0,0 +1,273 @@
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import select
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.utils.module_loading import import_string
+
+from apps.core.fields.multirange import PageRanges
+from apps.core.modifiers import ModifierContext, ModifierException, ModifierBusy, ModifierTimeout
+
+
+def _open(source: Union[str, bytes]):
+    # Imported lazily, the worker has to set up Django first
+    from apps.files.storage import get_storage
+
+    if isinstance(source, bytes):
+        return contextlib.nullcontext(File(io.BytesIO(source)))
+
+    return get_storage().open(source)
+
+
+def _spill(content: File) -> str:
+    """
+    Write the output into a temporary file, so it is not copied into memory and through the pipe. Path is returned
+    to the calling process, which removes the file.
+    """
+    with tempfile.NamedTemporaryFile("wb", suffix=".tmp", delete=False) as f:
+        try:
+            for chunk in content.chunks():
+                f.write(chunk)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+    return f.name
+
+
+def _generate(
+    source: Union[str, bytes],
+    modifier: str,
+    context: ModifierContext,
+    pages: Optional[PageRanges],
+    page_num,
+    annotation_map,
+    profile,
+) -> str:
+    instance = import_string(modifier)(context=context, pages=pages)
+
+    with _open(source) as f:
+        return _spill(instance.generate(f, page_num, annotation_map=annotation_map, profile=profile))
+
+
+def _render_generated(
+    file: File,
+    modifier: str,
+    context: ModifierContext,
+    pages: Optional[PageRanges],
+    page_num,
+    annotation_map,
+    dpi: int,
+    image_format: str,
+) -> bytes:
+    from apps.core.modifiers.pdf import render_page
+
+    instance = import_string(modifier)(context=context, pages=pages)
+    return render_page(instance.generate(file, page_num, annotation_map=annotation_map), 1, dpi, image_format)
+
+
+def _render(source: Union[str, bytes], *args) -> bytes:
+    with _open(source) as f:
+        return _render_generated(f, *args)
+
+
+def _worker_main(connection):
+    import django
+
+    django.setup()
+
+    while True:
+        try:
+            function, args = connection.recv()
+        except EOFError:
+            return
+
+        try:
+            result = ("ok", function(*args))
+        except Exception as e:
+            result = ("error", e)
+
+        try:
+            connection.send(result)
+        except Exception as e:
+            # Exception is not picklable
+            connection.send(("error", ModifierException(repr(e))))
+
+
+class Worker:
+    def __init__(self, context):
+        self._connection, child = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self._process.start()
+        child.close()
+
+    def run(self, job: tuple, timeout: float) -> Tuple[str, Union[bytes, str, Exception]]:
+        self._connection.send(job)
+
+        # select is cooperative if monkey patched by gevent, other greenlets run while the worker is busy
+        readable, _, _ = select.select([self._connection.fileno()], [], [], timeout)
+        if not readable:
+            raise ModifierTimeout()
+
+        return self._connection.recv()
+
+    def kill(self):
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+
+
+class ModifierPool:
+    """
+    Bounded pool of worker processes running modifiers and page rendering (PyMuPDF is CPU bound and blocks the whole
+    gevent worker).
+    At most EVILFLOWERS_MODIFIERS_POOL_SIZE jobs run at once, at most EVILFLOWERS_MODIFIERS_POOL_QUEUE jobs wait for
+    a free worker, others are rejected with ModifierBusy. Workers exceeding EVILFLOWERS_MODIFIERS_POOL_TIMEOUT or
+    crashed workers are killed and replaced on demand. Pool of size 0 runs modifiers in the calling process.
+    """
+
+    def __init__(self, size: int, queue_size: int, timeout: float):
+        self._size = size
+        self._timeout = timeout
+        self._admission = threading.BoundedSemaphore(size + queue_size) if size else None
+        self._idle: queue.Queue[Optional[Worker]] = queue.Queue()
+        # Workers are spawned (not forked from gevent worker) lazily, None is an empty slot
+        self._context = multiprocessing.get_context("spawn")
+
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _submit(self, file: File, function, *args) -> Union[bytes, str]:
+        if not self._admission.acquire(blocking=False):
+            raise ModifierBusy()
+
+        try:
+            # Files from storage are opened by the worker itself
+            source = file.name if isinstance(file, FieldFile) else file.read()
+            job = (function, (source, *args))
+            started_at = time.monotonic()
+
+            try:
+                worker = self._idle.get(timeout=self._timeout)
+            except queue.Empty:
+                raise ModifierTimeout()
+
+            try:
+                if worker is None:
+                    worker = Worker(self._context)
+                status, result = worker.run(job, max(self._timeout - (time.monotonic() - started_at), 0))
+            except (ModifierTimeout, EOFError, OSError) as e:
+                logging.warning(f"Modifier worker failed: {e!r}")
+                if worker is not None:
+                    worker.kill()
+                self._idle.put(None)
+                if isinstance(e, ModifierTimeout):
+                    raise
+                raise ModifierException("Modifier worker crashed") from e
+            except Exception:
+                # Job was not sent (e.g. it is not picklable), worker is fine
+                self._idle.put(worker)
+                raise
+            except BaseException:
+                # Interrupted in the middle of the job (e.g. greenlet killed), state of the worker is unknown
+                if worker is not None:
+                    worker.kill()
+                self._idle.put(None)
+                raise
+            else:
+                self._idle.put(worker)
+        finally:
+            self._admission.release()
+
+        # Raised by the job in the worker
+        if status == "error":
+            raise result
+
+        return result
+
+    def generate(
+        self,
+        modifier: str,
+        *,
+        context: ModifierContext,
+        pages: Optional[PageRanges],
+        file: File,
+        page_num=None,
+        annotation_map: dict[int, list[list]] = None,
+        profile: Optional[str] = None,
+    ) -> File:
+        if not self._size:
+            instance = import_string(modifier)(context=context, pages=pages)
+            return instance.generate(file, page_num, annotation_map=annotation_map, profile=profile)
+
+        path = self._submit(file, _generate, modifier, context, pages, page_num, annotation_map, profile)
+        output = open(path, "rb")
+        # Content stays readable through the open handle, disk space is released once it is closed
+        os.unlink(path)
+
+        return File(output)
+
+    def render(
+        self,
+        modifier: str,
+        *,
+        context: ModifierContext,
+        pages: Optional[PageRanges],
+        file: File,
+        page_num,
+        annotation_map: dict[int, list[list]] = None,
+        dpi: int,
+        image_format: str,
+    ) -> bytes:
+        """
+        Render the page of the generated document (numbered as page_num of generate(), license page included) as an
+        image (see apps.core.modifiers.pdf.render_page). The page is personalized by the modifier first.
+        """
+        args = (modifier, context, pages, page_num, annotation_map, dpi, image_format)
+
+        if not self._size:
+            return _render_generated(file, *args)
+
+        return self._submit(file, _render, *args)
+
+
+_pool: Optional[ModifierPool] = None
+_pool_lock = threading.Lock()
+
+
+def _reset():
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+# Workers belong to the process which started them
+os.register_at_fork(after_in_child=_reset)
+
+
+def get_pool() -> ModifierPool:
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ModifierPool(
+                    settings.EVILFLOWERS_MODIFIERS_POOL_SIZE,
+                    settings.EVILFLOWERS_MODIFIERS_POOL_QUEUE,
+                    settings.EVILFLOWERS_MODIFIERS_POOL_TIMEOUT.total_seconds(),
+                )
+
+    return _pool
+
+
+__all__ = ["ModifierPool", "get_pool"]
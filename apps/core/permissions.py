@@ -0,0 +1,18 @@
+from typing import Iterable, Dict, Any
+
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.auth.models import AnonymousUser
+from object_checker.base_object_checker import has_object_permission
+
+
+def has_objects_permission(
+    checker: str, user: AbstractBaseUser | AnonymousUser, objects: Iterable[Any]
+) -> Dict[Any, bool]:
+    """
+    Evaluate checker for many objects at once. Catalog and entry checkers answer from User.catalog_permissions, so
+    the whole batch costs at most one (cached) query. Result is keyed by the primary key of the object.
+    """
+    return {obj.pk: has_object_permission(checker, user, obj) for obj in objects}
+
+
+__all__ = ["has_objects_permission"]
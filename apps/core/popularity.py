@@ -0,0 +1,116 @@
+import logging
+import math
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict
+from uuid import UUID
+
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone as django_timezone
+
+from apps.core.redis import get_redis
+
+POPULARITY_KEY = "evilflowers:popularity"
+POPULARITY_FLUSH_KEY = "evilflowers:popularity:flushing"
+POPULARITY_LOCK_KEY = "evilflowers:popularity:lock"
+
+# Reference time of EntryRanking scores, downloads are weighted by exp(λ * (t - POPULARITY_EPOCH))
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def decay_offset(at: datetime) -> float:
+    """
+    Logarithm of the weight of a download made at the given time (λ * (t - POPULARITY_EPOCH), λ = ln 2 / half-life).
+    """
+    return (
+        (at - POPULARITY_EPOCH).total_seconds()
+        * math.log(2)
+        / settings.EVILFLOWERS_POPULARITY_HALF_LIFE.total_seconds()
+    )
+
+
+def increment(entry_id: UUID, amount: int = 1):
+    """
+    Atomically increment the buffered download counter of the entry. Counters are written to Entry.popularity
+    by flush(), entries are not saved on every download.
+    """
+    get_redis().hincrby(POPULARITY_KEY, str(entry_id), amount)
+
+
+def flush() -> int:
+    """
+    Move buffered counters into Entry.popularity using bulk UPDATE ... FROM (VALUES ...) and add them to time-decayed
+    EntryRanking scores (only entries downloaded since the last flush are touched). Signals are not fired and
+    touched_at is not changed. Counters are swapped out by RENAME, so increments made during the flush are kept for
+    the next one. If the flush fails, swapped counters are retried next time. Returns number of updated entries.
+    """
+    client = get_redis()
+    lock = client.lock(POPULARITY_LOCK_KEY, timeout=settings.EVILFLOWERS_POPULARITY_FLUSH_INTERVAL.total_seconds())
+
+    if not lock.acquire(blocking=False):
+        return 0
+
+    try:
+        if not client.exists(POPULARITY_FLUSH_KEY):
+            try:
+                client.rename(POPULARITY_KEY, POPULARITY_FLUSH_KEY)
+            except redis.ResponseError:
+                # Nothing was downloaded since the last flush
+                return 0
+
+        counters = {
+            UUID(entry_id.decode()): int(count) for entry_id, count in client.hgetall(POPULARITY_FLUSH_KEY).items()
+        }
+
+        with transaction.atomic():
+            updated = _update(counters)
+
+        client.delete(POPULARITY_FLUSH_KEY)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            logging.warning("Popularity flush took longer than its lock timeout")
+
+    return updated
+
+
+def _update(counters: Dict[UUID, int], batch_size: int = 1000) -> int:
+    updated = 0
+    items = iter(counters.items())
+    offset = decay_offset(django_timezone.now())
+
+    with connection.cursor() as cursor:
+        while batch := list(islice(items, batch_size)):
+            values = ", ".join(["(%s::uuid, %s::bigint)"] * len(batch))
+            params = [param for item in batch for param in item]
+
+            cursor.execute(
+                f"UPDATE entries SET popularity = entries.popularity + counters.amount "
+                f"FROM (VALUES {values}) AS counters (id, amount) "
+                f"WHERE entries.id = counters.id",
+                params,
+            )
+            updated += cursor.rowcount
+
+            # score = log(exp(score) + amount * exp(offset)), computed as log-sum-exp to avoid overflow
+            cursor.execute(
+                f"INSERT INTO entry_rankings (entry_id, catalog_id, score, updated_at) "
+                f"SELECT entries.id, entries.catalog_id, LN(counters.amount) + %s, NOW() "
+                f"FROM (VALUES {values}) AS counters (id, amount) "
+                f"JOIN entries ON entries.id = counters.id "
+                f"WHERE counters.amount > 0 "
+                f"ON CONFLICT (entry_id) DO UPDATE SET "
+                f"score = GREATEST(entry_rankings.score, EXCLUDED.score) "
+                f"+ LN(1 + EXP(-LEAST(ABS(entry_rankings.score - EXCLUDED.score), 700))), "
+                f"catalog_id = EXCLUDED.catalog_id, "
+                f"updated_at = EXCLUDED.updated_at",
+                [offset] + params,
+            )
+
+    return updated
+
+
+__all__ = ["increment", "flush", "decay_offset", "POPULARITY_EPOCH"]
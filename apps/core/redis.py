@@ -0,0 +1,24 @@
+import redis
+from django.conf import settings
+
+_connection: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Shared Redis connection for data structures which are not covered by the Django cache API (hashes, streams).
+    Connection pool of redis-py is fork-safe, connections are recreated in child processes.
+    """
+    global _connection
+
+    if _connection is None:
+        _connection = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DATABASE,
+        )
+
+    return _connection
+
+
+__all__ = ["get_redis"]
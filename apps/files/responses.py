@@ -0,0 +1,256 @@
+import hashlib
+import re
+import uuid
+from http import HTTPStatus
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.http import StreamingHttpResponse, HttpResponse, HttpResponseBase, HttpResponseRedirect
+from django.utils.http import content_disposition_header, http_date
+from django.utils.translation import gettext as _
+
+from apps.core.errors import ProblemDetailException
+from apps.files.storage import ObjectStat
+from apps.files.storage.filesystem import FileSystemStorage
+
+RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+ByteRange = Tuple[int, int]
+
+
+def parse_range_header(header: str, size: int, max_ranges: int = 16) -> Optional[List[ByteRange]]:
+    """
+    Parse RFC 7233 Range header into a list of inclusive (start, end) byte ranges. Returns None if the header should
+    be ignored (unsupported unit, invalid syntax or too many ranges) and an empty list if no range is satisfiable.
+    Overlapping and adjacent ranges are coalesced.
+    """
+    unit, separator, spec = header.partition("=")
+
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        match = RANGE_SPEC.match(part)
+        if not match:
+            return None
+
+        first, last = match.groups()
+
+        if not first:
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(size - suffix, 0), size - 1))
+            continue
+
+        first = int(first)
+
+        if last and int(last) < first:
+            return None
+
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+
+    if len(ranges) > max_ranges:
+        return None
+
+    result = []
+    for start, end in sorted(ranges):
+        if result and start <= result[-1][1] + 1:
+            result[-1] = (result[-1][0], max(result[-1][1], end))
+        else:
+            result.append((start, end))
+
+    return result
+
+
+class RangedFileResponse(StreamingHttpResponse):
+    """
+    File response with RFC 7233 byte range support (single range as 206 with Content-Range, multiple ranges as
+    multipart/byteranges). Files from storages are read using Storage.iter_range (ranged GetObject on S3), other files
+    have to be seekable.
+    """
+
+    block_size = 64 * 1024
+
+    def __init__(
+        self,
+        request,
+        file: File,
+        *,
+        filename: str,
+        content_type: str,
+        as_attachment: bool = True,
+        etag: Optional[str] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self._file = file
+        stat = self._stat()
+
+        if etag:
+            stat = stat._replace(etag=etag)
+
+        self["Accept-Ranges"] = "bytes"
+        self["ETag"] = stat.etag
+        if stat.modified_at:
+            self["Last-Modified"] = http_date(stat.modified_at.timestamp())
+        self["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+
+        ranges = None
+        if "Range" in request.headers and self._if_range(request, stat):
+            ranges = parse_range_header(request.headers["Range"], stat.size)
+
+        if ranges is None:
+            self["Content-Type"] = content_type
+            self["Content-Length"] = str(stat.size)
+            self.streaming_content = self._read(0, stat.size)
+        elif not ranges:
+            raise ProblemDetailException(
+                _("Requested range not satisfiable"),
+                status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                extra_headers=(("Content-Range", f"bytes */{stat.size}"),),
+            )
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = HTTPStatus.PARTIAL_CONTENT
+            self["Content-Type"] = content_type
+            self["Content-Range"] = f"bytes {start}-{end}/{stat.size}"
+            self["Content-Length"] = str(end - start + 1)
+            self.streaming_content = self._read(start, end - start + 1)
+        else:
+            boundary = uuid.uuid4().hex
+            parts = [
+                (
+                    (
+                        f"--{boundary}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Range: bytes {start}-{end}/{stat.size}\r\n\r\n"
+                    ).encode(),
+                    start,
+                    end,
+                )
+                for start, end in ranges
+            ]
+            closing = f"--{boundary}--\r\n".encode()
+
+            self.status_code = HTTPStatus.PARTIAL_CONTENT
+            self["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+            self["Content-Length"] = str(
+                sum(len(header) + end - start + 1 + 2 for header, start, end in parts) + len(closing)
+            )
+            self.streaming_content = self._read_multipart(parts, closing)
+
+    def _stat(self) -> ObjectStat:
+        if isinstance(self._file, FieldFile):
+            return self._file.storage.stat(self._file.name)
+
+        checksum = hashlib.md5(usedforsecurity=False)
+        self._file.seek(0)
+        while block := self._file.read(self.block_size):
+            checksum.update(block)
+
+        return ObjectStat(size=self._file.tell(), etag=f'"{checksum.hexdigest()}"')
+
+    @staticmethod
+    def _if_range(request, stat: ObjectStat) -> bool:
+        if_range = request.headers.get("If-Range")
+
+        if not if_range:
+            return True
+
+        if if_range.startswith('"'):
+            return if_range == stat.etag
+
+        return stat.modified_at is not None and if_range == http_date(stat.modified_at.timestamp())
+
+    def _read(self, offset: int, length: int) -> Iterator[bytes]:
+        if isinstance(self._file, FieldFile):
+            yield from self._file.storage.iter_range(self._file.name, offset, length, self.block_size)
+            return
+
+        self._file.seek(offset)
+        while length > 0 and (chunk := self._file.read(min(self.block_size, length))):
+            length -= len(chunk)
+            yield chunk
+
+    def _read_multipart(self, parts: List[Tuple[bytes, int, int]], closing: bytes) -> Iterator[bytes]:
+        for header, start, end in parts:
+            yield header
+            yield from self._read(start, end - start + 1)
+            yield b"\r\n"
+        yield closing
+
+
+class OffloadedFileResponse(HttpResponse):
+    """
+    Empty response which instructs the front proxy to send the file from FileSystemStorage by itself (X-Accel-Redirect
+    for nginx, X-Sendfile for Apache/lighttpd). Proxy takes care of ranges and conditional requests.
+    """
+
+    def __init__(self, file: FieldFile, *, filename: str, content_type: str, as_attachment: bool = True, **kwargs):
+        super().__init__(content_type=content_type, **kwargs)
+        self["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+
+        if settings.EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD == "x-accel-redirect":
+            location = settings.EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD_LOCATION.rstrip("/")
+            self["X-Accel-Redirect"] = f"{location}/{quote(file.name)}"
+        else:
+            self["X-Sendfile"] = file.path
+
+
+class PresignedRedirectResponse(HttpResponseRedirect):
+    """
+    Redirect to a short-lived presigned S3 URL, object store sends the bytes with the filename and content type
+    overridden by the signed response-* query parameters.
+    """
+
+    def __init__(self, file: FieldFile, *, filename: str, content_type: str, as_attachment: bool = True, **kwargs):
+        super().__init__(
+            file.storage.url(file.name, filename=filename, content_type=content_type, as_attachment=as_attachment),
+            **kwargs,
+        )
+        self["Cache-Control"] = "private, no-store"
+
+
+def file_response(
+    request, file: File, *, filename: str, content_type: str, as_attachment: bool = True, etag: Optional[str] = None
+) -> HttpResponseBase:
+    """
+    Response with the file content: presigned redirect (S3), offloaded to the front proxy (filesystem) or streamed
+    with range support. Missing file of a storage raises FileNotFoundError (except for redirects and offloading).
+    Optional etag replaces the storage ETag of streamed responses.
+    """
+    if settings.EVILFLOWERS_STORAGE_S3_REDIRECT and isinstance(file, FieldFile):
+        # S3 backend is an optional dependency
+        from apps.files.storage.s3 import S3Storage
+
+        if isinstance(file.storage, S3Storage):
+            return PresignedRedirectResponse(
+                file, filename=filename, content_type=content_type, as_attachment=as_attachment
+            )
+
+    if (
+        settings.EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD
+        and isinstance(file, FieldFile)
+        and isinstance(file.storage, FileSystemStorage)
+    ):
+        return OffloadedFileResponse(file, filename=filename, content_type=content_type, as_attachment=as_attachment)
+
+    return RangedFileResponse(
+        request, file, filename=filename, content_type=content_type, as_attachment=as_attachment, etag=etag
+    )
+
+
+__all__ = [
+    "RangedFileResponse",
+    "OffloadedFileResponse",
+    "PresignedRedirectResponse",
+    "file_response",
+    "parse_range_header",
+]
@@ -1,7 +1,103 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
 from django.conf import settings
 from django.core.files.storage import Storage
 from django.utils.module_loading import import_string
 
 
+class ObjectStat(NamedTuple):
+    size: int
+    etag: str
+    modified_at: Optional[datetime] = None
+
+
+class HashingReader:
+    """
+    Read-only stream wrapper computing SHA-256 checksum and size of the data on the fly.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._checksum = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self._checksum.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    @property
+    def checksum(self) -> str:
+        return self._checksum.hexdigest()
+
+
+def checksum_cache_key(name: str) -> str:
+    return f"checksum:{name}"
+
+
+def evict_lru(directory: Path, max_size: int, low_watermark: float = 0.9):
+    """
+    Remove least recently used entries of two-level cache directory until its size drops under
+    low_watermark * max_size. Entry is a file together with its sidecars (files of the same name with a suffix, e.g.
+    metadata), all of them count towards the size, even if the file itself is missing. Entry is as recent as its most
+    recently modified file. Temporary and lock files are skipped.
+    """
+    entries = {}
+    total = 0
+
+    for path in directory.glob("*/*"):
+        if path.suffix in (".tmp", ".lock"):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entry = entries.setdefault(path.with_suffix(""), [0.0, 0, []])
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+        total += stat.st_size
+
+    if total <= max_size:
+        return
+
+    for mtime, size, paths in sorted(entries.values(), key=lambda entry: entry[0]):
+        for item in paths:
+            try:
+                os.unlink(item)
+            except FileNotFoundError:
+                pass
+        total -= size
+        if total <= max_size * low_watermark:
+            break
+
+
+_evicted_at: Dict[Path, float] = {}
+_evicted_at_lock = threading.Lock()
+
+
+def schedule_eviction(directory: Path, max_size: int, interval: float = 60):
+    """
+    Run evict_lru() in a background thread, at most once per interval for the directory in the process. Caches are
+    local to the node, so every process writing into them takes care of the eviction, outside of the request path.
+    The size limit may be exceeded by writes between two evictions.
+    """
+    now = time.monotonic()
+
+    with _evicted_at_lock:
+        if directory in _evicted_at and now - _evicted_at[directory] < interval:
+            return
+        _evicted_at[directory] = now
+
+    threading.Thread(target=evict_lru, args=(directory, max_size), daemon=True).start()
+
+
 def get_storage() -> Storage:
     return import_string(settings.EVILFLOWERS_STORAGE_DRIVER)()
@@ -0,0 +1,275 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.utils.deconstruct import deconstructible
+
+from apps.files.storage import ObjectStat, checksum_cache_key, schedule_eviction
+from apps.files.storage.s3 import S3Storage
+
+
+class IntegrityError(Exception):
+    pass
+
+
+@deconstructible
+class CachedS3Storage(S3Storage):
+    """
+    Read-through local disk cache in front of S3Storage. Object content and stat metadata are kept in
+    EVILFLOWERS_STORAGE_CACHE_DATADIR, total size (including metadata) is bounded by EVILFLOWERS_STORAGE_CACHE_MAX_SIZE
+    and the least recently used objects are evicted first (modification time of the cached file is bumped on every
+    hit), eviction runs in the background.
+
+    Metadata is revalidated against the bucket after EVILFLOWERS_STORAGE_CACHE_STAT_TTL, cached content of objects
+    removed or rewritten in place (e.g. by OCR) is dropped then. Downloaded content is verified against the stored
+    SHA-256 checksum (and single-part MD5 ETag) before it is published to the cache.
+
+    Nothing ever waits for a lock: every object is downloaded by a single process at a time, streamed reads of missing
+    objects are proxied to the bucket while the cache is filled in a background thread, whole file opens (modifiers)
+    fill the cache themselves or read from the bucket if someone else is filling it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._directory = Path(settings.EVILFLOWERS_STORAGE_CACHE_DATADIR)
+        os.makedirs(self._directory, exist_ok=True)
+
+    def _cache_path(self, name: str) -> Path:
+        key = hashlib.sha256(name.encode()).hexdigest()
+        return self._directory / key[:2] / key
+
+    def _read_stat(self, name: str, max_age: Optional[float] = None) -> Optional[ObjectStat]:
+        try:
+            with open(self._cache_path(name).with_suffix(".json")) as f:
+                age = time.time() - os.fstat(f.fileno()).st_mtime
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if max_age is not None and age > max_age:
+            return None
+
+        return ObjectStat(
+            size=data["size"],
+            etag=data["etag"],
+            modified_at=datetime.fromisoformat(data["modified_at"]) if data["modified_at"] else None,
+        )
+
+    def _write_stat(self, name: str, stat: ObjectStat):
+        path = self._cache_path(name).with_suffix(".json")
+        os.makedirs(path.parent, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as f:
+            json.dump(
+                {
+                    "name": name,
+                    "size": stat.size,
+                    "etag": stat.etag,
+                    "modified_at": stat.modified_at.isoformat() if stat.modified_at else None,
+                },
+                f,
+            )
+        os.replace(f.name, path)
+
+    def _discard(self, name: str):
+        for item in (self._cache_path(name), self._cache_path(name).with_suffix(".json")):
+            try:
+                os.unlink(item)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def _lock(self, name: str) -> Iterator[bool]:
+        """
+        Non-blocking exclusive lock of the cache entry shared by all processes on the node, yields False if it is held
+        by someone else. Locks are striped over a fixed set of files which are never removed (removed lock file could
+        be locked again by two processes at once).
+        """
+        path = self._directory / "locks" / f"{self._cache_path(name).name[:3]}.lock"
+        os.makedirs(path.parent, exist_ok=True)
+
+        with open(path, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _fill(self, name: str, stat: ObjectStat) -> Optional[BinaryIO]:
+        """
+        Download the object and publish it to the cache once it passed the integrity check. Returns the opened cached
+        content or None if someone else is downloading it.
+        """
+        with self._lock(name) as locked:
+            if not locked:
+                return None
+
+            cached = self._cached(name, stat)
+            if cached is not None:
+                return cached
+
+            path = self._cache_path(name)
+            os.makedirs(path.parent, exist_ok=True)
+
+            sha256 = hashlib.sha256()
+            md5 = hashlib.md5(usedforsecurity=False)
+
+            with tempfile.NamedTemporaryFile("wb", dir=path.parent, suffix=".tmp", delete=False) as f:
+                try:
+                    for chunk in super().iter_range(name, 0, stat.size):
+                        sha256.update(chunk)
+                        md5.update(chunk)
+                        f.write(chunk)
+                    f.flush()
+
+                    etag = stat.etag.strip('"')
+                    expected_checksum = cache.get(checksum_cache_key(name))
+
+                    if f.tell() != stat.size:
+                        raise IntegrityError(f"Size mismatch of {name} ({f.tell()} != {stat.size})")
+                    if "-" not in etag and md5.hexdigest() != etag:
+                        raise IntegrityError(f"ETag mismatch of {name}")
+                    if expected_checksum and sha256.hexdigest() != expected_checksum:
+                        raise IntegrityError(f"Checksum mismatch of {name}")
+                except BaseException:
+                    os.unlink(f.name)
+                    raise
+
+            os.replace(f.name, path)
+            self._write_stat(name, stat)
+            cache.set(
+                checksum_cache_key(name), sha256.hexdigest(), settings.EVILFLOWERS_CACHE_SERVER_HASHES.total_seconds()
+            )
+            self._evict()
+
+            return open(path, "rb")
+
+    def _fill_background(self, name: str, stat: ObjectStat):
+        def fill():
+            try:
+                cached = self._fill(name, stat)
+            except Exception as e:
+                logging.warning(f"Unable to cache S3 object: {e}")
+            else:
+                if cached is not None:
+                    cached.close()
+
+        threading.Thread(target=fill, daemon=True).start()
+
+    def _evict(self):
+        schedule_eviction(self._directory, settings.EVILFLOWERS_STORAGE_CACHE_MAX_SIZE)
+
+    def _cached(self, name: str, stat: ObjectStat) -> Optional[BinaryIO]:
+        """
+        Opened cached content of the object or None. Content is opened before it is touched, so a concurrent eviction
+        can not remove it in between.
+        """
+        try:
+            f = open(self._cache_path(name), "rb")
+        except FileNotFoundError:
+            return None
+
+        if os.fstat(f.fileno()).st_size != stat.size:
+            f.close()
+            return None
+
+        os.utime(f.fileno())
+        return f
+
+    @staticmethod
+    def _cacheable(stat: ObjectStat) -> bool:
+        return stat.size <= settings.EVILFLOWERS_STORAGE_CACHE_MAX_SIZE * 0.5
+
+    def _open(self, name, mode="rb"):
+        stat = self.stat(name)
+        cached = self._cached(name, stat)
+
+        if cached is None and self._cacheable(stat):
+            try:
+                cached = self._fill(name, stat)
+            except IntegrityError as e:
+                logging.warning(f"Unable to cache S3 object: {e}")
+
+        if cached is None:
+            return super()._open(name, mode)
+
+        return File(cached, name=name)
+
+    def delete(self, name):
+        super().delete(name)
+        self._discard(name)
+
+    def move(self, source, target) -> str:
+        target = super().move(source, target)
+        self._discard(source)
+        self._discard(target)
+        return target
+
+    def exists(self, name):
+        try:
+            self.stat(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self, name):
+        return self.stat(name).size
+
+    def stat(self, name) -> ObjectStat:
+        stat = self._read_stat(name, settings.EVILFLOWERS_STORAGE_CACHE_STAT_TTL.total_seconds())
+
+        if stat is None:
+            try:
+                stat = super().stat(name)
+            except FileNotFoundError:
+                self._discard(name)
+                raise
+
+            # Object was rewritten in place, its cached content and checksum are stale
+            previous = self._read_stat(name)
+            if previous is not None and previous.etag != stat.etag:
+                self._discard(name)
+                cache.delete(checksum_cache_key(name))
+            self._write_stat(name, stat)
+
+            # Metadata of objects which are never cached counts towards the size of the cache too
+            if previous is None:
+                self._evict()
+
+        return stat
+
+    def iter_range(self, name, offset: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        stat = self.stat(name)
+        cached = self._cached(name, stat)
+
+        if cached is None:
+            if self._cacheable(stat):
+                self._fill_background(name, stat)
+            yield from super().iter_range(name, offset, length, chunk_size)
+            return
+
+        with cached:
+            cached.seek(offset)
+            while length > 0 and (chunk := cached.read(min(chunk_size, length))):
+                length -= len(chunk)
+                yield chunk
+
+
+__all__ = ["CachedS3Storage"]
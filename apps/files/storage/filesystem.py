@@ -1,11 +1,15 @@
 import os
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Iterator
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.files.storage import FileSystemStorage as DjangoFileSystemStorage
 from django.utils.deconstruct import deconstructible
 
+from apps.files.storage import ObjectStat
+
 
 @deconstructible
 class FileSystemStorage(DjangoFileSystemStorage):
@@ -21,3 +25,23 @@ class FileSystemStorage(DjangoFileSystemStorage):
 
     def __eq__(self, other):
         return self.subdir == other.subdir
+
+    def move(self, source, target) -> str:
+        os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+        os.replace(self.path(source), self.path(target))
+        return target
+
+    def stat(self, name) -> ObjectStat:
+        stat = os.stat(self.path(name))
+        return ObjectStat(
+            size=stat.st_size,
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            modified_at=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def iter_range(self, name, offset: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self.path(name), "rb") as f:
+            f.seek(offset)
+            while length > 0 and (chunk := f.read(min(chunk_size, length))):
+                length -= len(chunk)
+                yield chunk
@@ -1,22 +1,87 @@
-from io import BytesIO
+import os
+import socket
+import threading
+from datetime import timedelta
+from io import UnsupportedOperation
 from mimetypes import guess_type
+from typing import Iterator, Optional, Dict
 
+import certifi
 import minio
+import minio.error
+from minio.commonconfig import CopySource
+import urllib3
+from urllib3.connection import HTTPConnection
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files import File
 from django.core.files.storage import Storage
 from django.utils.deconstruct import deconstructible
+from django.utils.http import content_disposition_header
+
+from apps.files.storage import ObjectStat, HashingReader, checksum_cache_key
+
+_clients: Dict[str, minio.Minio] = {}
+_clients_lock = threading.Lock()
+
+# Pooled connections must not be shared between the parent and forked (gunicorn, celery) workers
+os.register_at_fork(after_in_child=_clients.clear)
+
+
+def get_client(host: str) -> minio.Minio:
+    """
+    Process-wide S3 client registry. All storage instances share one client (and its urllib3 connection pool) per
+    host instead of opening new connections for every storage instance.
+    """
+    if host in _clients:
+        return _clients[host]
+
+    with _clients_lock:
+        if host not in _clients:
+            socket_options = HTTPConnection.default_socket_options
+            if settings.EVILFLOWERS_STORAGE_S3_KEEPALIVE:
+                socket_options = socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+            _clients[host] = minio.Minio(
+                host,
+                access_key=settings.EVILFLOWERS_STORAGE_S3_ACCESS_KEY,
+                secret_key=settings.EVILFLOWERS_STORAGE_S3_SECRET_KEY,
+                secure=settings.EVILFLOWERS_STORAGE_S3_SECURE,
+                region=settings.EVILFLOWERS_STORAGE_S3_REGION,
+                http_client=urllib3.PoolManager(
+                    timeout=urllib3.Timeout(
+                        connect=settings.EVILFLOWERS_STORAGE_S3_TIMEOUT, read=settings.EVILFLOWERS_STORAGE_S3_TIMEOUT
+                    ),
+                    maxsize=settings.EVILFLOWERS_STORAGE_S3_POOL_SIZE,
+                    cert_reqs="CERT_REQUIRED",
+                    ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+                    retries=urllib3.Retry(
+                        total=settings.EVILFLOWERS_STORAGE_S3_RETRIES,
+                        backoff_factor=0.2,
+                        status_forcelist=[500, 502, 503, 504],
+                    ),
+                    socket_options=socket_options,
+                ),
+            )
+
+    return _clients[host]
 
 
 @deconstructible
 class S3Storage(Storage):
     def __init__(self):
-        self._client = minio.Minio(
-            settings.EVILFLOWERS_STORAGE_S3_HOST,
-            access_key=settings.EVILFLOWERS_STORAGE_S3_ACCESS_KEY,
-            secret_key=settings.EVILFLOWERS_STORAGE_S3_SECRET_KEY,
-            secure=settings.EVILFLOWERS_STORAGE_S3_SECURE,
-        )
+        self._client = get_client(settings.EVILFLOWERS_STORAGE_S3_HOST)
+
+        if settings.EVILFLOWERS_STORAGE_S3_PUBLIC_HOST:
+            # Presigning is done offline only if the region is known, otherwise the client looks it up on the host
+            if not settings.EVILFLOWERS_STORAGE_S3_REGION:
+                raise ImproperlyConfigured(
+                    "EVILFLOWERS_STORAGE_S3_REGION has to be set with EVILFLOWERS_STORAGE_S3_PUBLIC_HOST"
+                )
+            self._presign_client = get_client(settings.EVILFLOWERS_STORAGE_S3_PUBLIC_HOST)
+        else:
+            self._presign_client = self._client
 
     def _open(self, name, mode="rb"):
         return File(self._client.get_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name))
@@ -27,18 +92,40 @@ class S3Storage(Storage):
         if not content_type:
             content_type = guess_type(name)[0]
 
-        content = BytesIO(content.read())
-        content.seek(0)
+        try:
+            content.seek(0)
+        except (AttributeError, UnsupportedOperation):
+            pass
 
+        # Stream straight from the (temporary) upload file, minio buffers at most one part in memory
+        reader = HashingReader(content)
         s3_object = self._client.put_object(
             settings.EVILFLOWERS_STORAGE_S3_BUCKET,
             name,
-            content,
-            content.getbuffer().nbytes,
+            reader,
+            length=getattr(content, "size", None) or -1,
+            part_size=settings.EVILFLOWERS_STORAGE_S3_PART_SIZE,
             content_type=content_type,
         )
+
+        cache.set(
+            checksum_cache_key(s3_object.object_name),
+            reader.checksum,
+            settings.EVILFLOWERS_CACHE_SERVER_HASHES.total_seconds(),
+        )
+
         return s3_object.object_name
 
+    def move(self, source, target) -> str:
+        """
+        Move the object within the bucket (server-side copy, the content is not transferred through the app).
+        """
+        self._client.copy_object(
+            settings.EVILFLOWERS_STORAGE_S3_BUCKET, target, CopySource(settings.EVILFLOWERS_STORAGE_S3_BUCKET, source)
+        )
+        self._client.remove_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, source)
+        return target
+
     def save_from_path(self, name, path):
         s3_object = self._client.fput_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name, path)
         return s3_object.object_name
@@ -64,8 +151,28 @@ class S3Storage(Storage):
         s3_object = self._client.stat_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name)
         return s3_object.size
 
-    def url(self, name):
-        url = self._client.presigned_get_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name)
+    def url(
+        self,
+        name,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        as_attachment: bool = True,
+        expires: Optional[timedelta] = None,
+    ):
+        response_headers = {}
+
+        if filename:
+            response_headers["response-content-disposition"] = content_disposition_header(as_attachment, filename)
+
+        if content_type:
+            response_headers["response-content-type"] = content_type
+
+        url = self._presign_client.presigned_get_object(
+            settings.EVILFLOWERS_STORAGE_S3_BUCKET,
+            name,
+            expires=expires or settings.EVILFLOWERS_STORAGE_S3_REDIRECT_EXPIRATION,
+            response_headers=response_headers or None,
+        )
         return url
 
     def get_accessed_time(self, name):
@@ -78,3 +185,20 @@ class S3Storage(Storage):
     def get_modified_time(self, name):
         s3_object = self._client.stat_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name)
         return s3_object.last_modified
+
+    def stat(self, name) -> ObjectStat:
+        try:
+            s3_object = self._client.stat_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name)
+        except minio.error.S3Error as e:
+            if e.code in ("NoSuchKey", "NotFound"):
+                raise FileNotFoundError(name) from e
+            raise
+        return ObjectStat(size=s3_object.size, etag=f'"{s3_object.etag}"', modified_at=s3_object.last_modified)
+
+    def iter_range(self, name, offset: int, length: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        response = self._client.get_object(settings.EVILFLOWERS_STORAGE_S3_BUCKET, name, offset=offset, length=length)
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
@@ -4,6 +4,7 @@ from apps.files.views import (
     AcquisitionDownload,
     EntryImageDownload,
     UserAcquisitionDownload,
+    UserAcquisitionPageRender,
     EntryThumbnailDownload,
 )
 
@@ -19,6 +20,11 @@ urlpatterns = [
         UserAcquisitionDownload.as_view(),
         name="user-acquisition-download",
     ),
+    path(
+        "user-acquisitions/<uuid:user_acquisition_id>/pages/<int:page>",
+        UserAcquisitionPageRender.as_view(),
+        name="user-acquisition-page",
+    ),
     path("covers/<uuid:entry_id>", EntryImageDownload.as_view(), name="cover-download"),
     path("thumbnails/<uuid:entry_id>", EntryThumbnailDownload.as_view(), name="thumbnail-download"),
 ]
@@ -1,31 +1,135 @@
-import base64
+import io
+import json
 import uuid
 from collections import defaultdict
+from contextlib import contextmanager
 from http import HTTPStatus
 from mimetypes import guess_extension
+from typing import Optional
 
 from django.conf import settings
-from django.http import FileResponse
+from django.core.files import File
+from django.http import HttpResponseBase, HttpResponseNotModified, HttpResponseRedirect
 from django.urls import reverse
-from django.utils.module_loading import import_string
+from django.utils.http import parse_etags
 from django.utils.text import slugify
-from django.utils.translation import gettext as _
+from django.utils.translation import gettext as _, gettext_noop
 from object_checker.base_object_checker import has_object_permission
 
 from apps import openapi
-from apps.api.response import SingleResponse, SeeOtherResponse
+from apps.api.response import SeeOtherResponse, Base64StreamingResponse
+from apps.core import analytics, popularity
 from apps.core.errors import ProblemDetailException, DetailType, AuthorizationException
-from apps.core.fields.multirange import depack
-from apps.core.models import Acquisition, Entry, UserAcquisition, AnnotationItem
-from apps.core.modifiers import InvalidPage
+from apps.core.fields.multirange import PageRanges
+from apps.core.models import Acquisition, Entry, UserAcquisition, AnnotationItem, PageIndex
+from apps.core.modifiers import ModifierContext, InvalidPage, ModifierBusy, ModifierTimeout, InvalidDocument
+from apps.core.modifiers.cache import ModifierCache
+from apps.core.modifiers.pool import get_pool
 from apps.core.views import SecuredView
+from apps.files.responses import file_response
+
+
+@contextmanager
+def modifier_errors():
+    """
+    Translate errors of the modifier pool into problem details.
+    """
+    try:
+        yield
+    except InvalidPage:
+        raise ProblemDetailException(_("Page not found"), status=HTTPStatus.NOT_FOUND)
+    except ModifierBusy:
+        raise ProblemDetailException(
+            _("Too many documents are being generated, try again later"),
+            status=HTTPStatus.SERVICE_UNAVAILABLE,
+            extra_headers=(("Retry-After", "5"),),
+        )
+    except ModifierTimeout:
+        raise ProblemDetailException(_("Document generation timed out"), status=HTTPStatus.GATEWAY_TIMEOUT)
+    except InvalidDocument:
+        raise ProblemDetailException(
+            _("Document can not be generated from the acquisition"), status=HTTPStatus.UNPROCESSABLE_ENTITY
+        )
+
+
+def counts_as_download(request, response: HttpResponseBase) -> bool:
+    """
+    Only successful responses with the whole document or its first range count as a download (popularity and
+    analytics). Viewers fetch a single document using many range requests, rendered pages are not downloads at all.
+    """
+    if request.GET.get("page", None) is not None:
+        return False
+
+    if response.status_code == HTTPStatus.PARTIAL_CONTENT:
+        return response.get("Content-Range", "").startswith("bytes 0-")
+
+    # Ranges of presigned redirects are served by the object store
+    if response.status_code == HTTPStatus.FOUND:
+        return request.headers.get("Range", "bytes=0-").replace(" ", "").startswith("bytes=0-")
+
+    return response.status_code == HTTPStatus.OK
+
+
+def modifier_context(request, user_acquisition: UserAcquisition) -> ModifierContext:
+    """
+    Personalization of the generated document. Anonymous downloads are identified by random id.
+    """
+    return {
+        "id": str(uuid.uuid4()) if request.user.is_anonymous else str(user_acquisition.id),
+        "user_id": str(user_acquisition.user_id),
+        "title": user_acquisition.acquisition.entry.title,
+        "username": user_acquisition.user.username,
+        "authors": ", ".join([a.full_name for a in user_acquisition.acquisition.entry.authors.all()]),
+        "language": (
+            user_acquisition.acquisition.entry.language.alpha2 if user_acquisition.acquisition.entry.language else None
+        ),
+    }
+
+
+def annotation_map(user_acquisition: UserAcquisition) -> dict[int, list[list]]:
+    """
+    Compiled drawing operations of all annotations of the user acquisition by page.
+    """
+    result = defaultdict(list)
+    items = AnnotationItem.objects.filter(annotation__user_acquisition=user_acquisition).values("page", "ops")
+
+    for item in items:
+        result[item["page"]].extend(item["ops"])
+
+    return dict(result)
+
+
+def validate_page(user_acquisition: UserAcquisition, page: str):
+    """
+    Reject pages outside of the generated document (license page included) using the page index, before the
+    document is opened. Pages of acquisitions which are not indexed yet are validated by the modifier.
+    """
+    page_count = (
+        PageIndex.objects.filter(acquisition_id=user_acquisition.acquisition_id)
+        .values_list("page_count", flat=True)
+        .first()
+    )
+
+    if page_count is None:
+        return
+
+    if user_acquisition.range:
+        page_count = len(user_acquisition.range & PageRanges([(1, page_count)]))
+
+    try:
+        valid = 1 <= int(page) <= page_count + 1
+    except ValueError:
+        valid = False
+
+    if not valid:
+        raise ProblemDetailException(_("Page not found"), status=HTTPStatus.NOT_FOUND)
 
 
 class AcquisitionDownload(SecuredView):
     @openapi.metadata(description="Download Acquisition content", tags=["Files"])
     def get(self, request, acquisition_id: uuid.UUID):
         try:
-            acquisition = Acquisition.objects.get(pk=acquisition_id)
+            acquisition = Acquisition.objects.select_related("entry").get(pk=acquisition_id)
         except Acquisition.DoesNotExist:
             raise ProblemDetailException(_("Acquisition not found"), status=HTTPStatus.NOT_FOUND)
 
@@ -70,13 +174,20 @@ class AcquisitionDownload(SecuredView):
                 + params.urlencode()
             )
 
-        acquisition.entry.popularity = acquisition.entry.popularity + 1
         sanitized_filename = f"{slugify(acquisition.entry.title.lower())}{guess_extension(acquisition.mime)}"
 
         if request.GET.get("format", None) == "base64":
-            return SingleResponse(request, data={"data": base64.b64encode(acquisition.content.read()).decode()})
+            response = Base64StreamingResponse(request, acquisition.content)
+        else:
+            response = file_response(
+                request, acquisition.content, filename=sanitized_filename, content_type=acquisition.mime
+            )
 
-        return FileResponse(acquisition.content, as_attachment=True, filename=sanitized_filename)
+        if counts_as_download(request, response):
+            popularity.increment(acquisition.entry_id)
+            analytics.record(acquisition, user=request.user)
+
+        return response
 
 
 class UserAcquisitionDownload(SecuredView):
@@ -97,84 +208,247 @@ class UserAcquisitionDownload(SecuredView):
             if not has_object_permission("check_user_acquisition_read", request.user, user_acquisition):
                 raise AuthorizationException(request)
 
-        user_acquisition.acquisition.entry.popularity = user_acquisition.acquisition.entry.popularity + 1
-        user_acquisition.acquisition.entry.save()
-
         sanitized_filename = (
             f"{slugify(user_acquisition.acquisition.entry.title.lower())}"
             f"{guess_extension(user_acquisition.acquisition.mime)}"
         )
 
-        if user_acquisition.acquisition.mime in settings.EVILFLOWERS_MODIFIERS:
-            modifier = import_string(settings.EVILFLOWERS_MODIFIERS[user_acquisition.acquisition.mime])(
-                context={
-                    "id": str(uuid.uuid4()) if request.user.is_anonymous else str(user_acquisition.id),
-                    "user_id": str(user_acquisition.user_id),
-                    "title": user_acquisition.acquisition.entry.title,
-                    "username": user_acquisition.user.username,
-                    "authors": ", ".join([a.full_name for a in user_acquisition.acquisition.entry.authors.all()]),
-                    "language": (
-                        user_acquisition.acquisition.entry.language.alpha2
-                        if user_acquisition.acquisition.entry.language
-                        else None
-                    ),
-                },
-                pages=depack(user_acquisition.range) if user_acquisition.range else None,
-            )
+        etag = None
 
-            annotation_map = defaultdict(list)
-            if request.GET.get("annotations", None) == "true":
-                annotation_items = AnnotationItem.objects.filter(annotation__user_acquisition=user_acquisition).values(
-                    "page", "content"
-                )
-                for item in annotation_items:
-                    annotation_map[item["page"]].append(item["content"])
-                annotation_map = dict(annotation_map)
-
-            try:
-                content = modifier.generate(
-                    user_acquisition.acquisition.content,
-                    request.GET.get("page", None),
-                    annotation_map=dict(annotation_map),
+        if user_acquisition.acquisition.mime in settings.EVILFLOWERS_MODIFIERS:
+            context = modifier_context(request, user_acquisition)
+            annotations = request.GET.get("annotations", None) == "true"
+            page = request.GET.get("page", None)
+            profile = user_acquisition.acquisition.entry.read_config("evilflowers_pdf_profile") or None
+
+            if page is not None:
+                validate_page(user_acquisition, page)
+
+            # Anonymous downloads are identified by random id, their outputs are never reused
+            output_cache = ModifierCache()
+            cache_key = None
+            content = None
+
+            if output_cache.enabled and request.user.is_authenticated:
+                cache_key = output_cache.key(
+                    user_acquisition.acquisition.checksum,
+                    json.dumps(context, sort_keys=True),
+                    user_acquisition.range,
+                    page,
+                    profile,
+                    user_acquisition.overlay_version if annotations else None,
                 )
-            except InvalidPage:
-                raise ProblemDetailException(_("Page not found"), status=HTTPStatus.NOT_FOUND)
+                content = output_cache.get(cache_key)
+
+            if content is None:
+                with modifier_errors():
+                    content = get_pool().generate(
+                        settings.EVILFLOWERS_MODIFIERS[user_acquisition.acquisition.mime],
+                        context=context,
+                        pages=user_acquisition.range,
+                        file=user_acquisition.acquisition.content,
+                        page_num=page,
+                        annotation_map=annotation_map(user_acquisition) if annotations else {},
+                        profile=profile,
+                    )
+
+                if cache_key:
+                    content = output_cache.set(cache_key, content)
+
+            if cache_key:
+                etag = f'"{cache_key}"'
         else:
             content = user_acquisition.acquisition.content
 
         if request.GET.get("format", None) == "base64":
-            return SingleResponse(request, data={"data": base64.b64encode(content.read()).decode()})
+            response = Base64StreamingResponse(request, content)
+        else:
+            response = file_response(
+                request,
+                content,
+                filename=sanitized_filename,
+                content_type=user_acquisition.acquisition.mime,
+                etag=etag,
+            )
 
-        return FileResponse(content, as_attachment=True, filename=sanitized_filename)
+        if counts_as_download(request, response):
+            popularity.increment(user_acquisition.acquisition.entry_id)
+            analytics.record(user_acquisition.acquisition, user_acquisition=user_acquisition, user=request.user)
 
+        return response
 
-class EntryImageDownload(SecuredView):
-    @openapi.metadata(description="Download Entry cover image", tags=["Files"])
-    def get(self, request, entry_id: uuid.UUID):
+
+class UserAcquisitionPageRender(SecuredView):
+    FORMATS = ("webp", "png")
+
+    @openapi.metadata(description="Render page of UserAcquisition as an image", tags=["Files"])
+    def get(self, request, user_acquisition_id: uuid.UUID, page: int):
         try:
-            entry = Entry.objects.get(pk=entry_id, image__isnull=False)
-        except Entry.DoesNotExist:
-            raise ProblemDetailException(_("Entry image not found"), status=HTTPStatus.NOT_FOUND)
+            user_acquisition = UserAcquisition.objects.select_related("acquisition", "acquisition__entry").get(
+                pk=user_acquisition_id
+            )
+        except UserAcquisition.DoesNotExist:
+            raise ProblemDetailException(
+                _("User acquisition not found"),
+                status=HTTPStatus.NOT_FOUND,
+                detail_type=DetailType.NOT_FOUND,
+            )
 
-        sanitized_filename = f"{slugify(entry.title.lower())}{guess_extension(entry.image_mime)}"
+        if user_acquisition.type == UserAcquisition.UserAcquisitionType.PERSONAL:
+            if not has_object_permission("check_user_acquisition_read", request.user, user_acquisition):
+                raise AuthorizationException(request)
 
-        if not entry.image.storage.exists(entry.image.name):
-            raise ProblemDetailException(_("Entry image file not found"), status=HTTPStatus.NOT_FOUND)
+        acquisition = user_acquisition.acquisition
 
-        return FileResponse(entry.image, filename=sanitized_filename)
+        if (
+            acquisition.mime != Acquisition.AcquisitionMIME.PDF
+            or acquisition.mime not in settings.EVILFLOWERS_MODIFIERS
+        ):
+            raise ProblemDetailException(
+                _("Only pages of PDF acquisitions can be rendered"), status=HTTPStatus.BAD_REQUEST
+            )
 
+        image_format = request.GET.get("format", "webp")
+        if image_format not in self.FORMATS:
+            raise ProblemDetailException(_("Unsupported image format"), status=HTTPStatus.BAD_REQUEST)
 
-class EntryThumbnailDownload(SecuredView):
-    @openapi.metadata(description="Download Entry thumbnail", tags=["Files"])
-    def get(self, request, entry_id: uuid.UUID):
         try:
-            entry = Entry.objects.get(pk=entry_id, thumbnail__isnull=False)
+            dpi = int(request.GET.get("dpi", settings.EVILFLOWERS_RENDER_DPI))
+        except ValueError:
+            dpi = 0
+
+        if not 1 <= dpi <= settings.EVILFLOWERS_RENDER_MAX_DPI:
+            raise ProblemDetailException(
+                _("DPI has to be between 1 and %(max_dpi)d") % {"max_dpi": settings.EVILFLOWERS_RENDER_MAX_DPI},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+        # Pages are numbered as pages of the generated document (license page included)
+        validate_page(user_acquisition, page)
+
+        context = modifier_context(request, user_acquisition)
+        annotations = request.GET.get("annotations", None) == "true"
+
+        # Rendered pages are personalized, cached the same way as generated documents
+        render_cache = ModifierCache(
+            settings.EVILFLOWERS_RENDER_CACHE_DATADIR, settings.EVILFLOWERS_RENDER_CACHE_MAX_SIZE
+        )
+        cache_key = None
+        content = None
+
+        if render_cache.enabled and request.user.is_authenticated:
+            cache_key = render_cache.key(
+                acquisition.checksum,
+                json.dumps(context, sort_keys=True),
+                user_acquisition.range,
+                page,
+                user_acquisition.overlay_version if annotations else None,
+                dpi,
+                image_format,
+            )
+            content = render_cache.get(cache_key)
+
+        if content is None:
+            with modifier_errors():
+                content = File(
+                    io.BytesIO(
+                        get_pool().render(
+                            settings.EVILFLOWERS_MODIFIERS[acquisition.mime],
+                            context=context,
+                            pages=user_acquisition.range,
+                            file=acquisition.content,
+                            page_num=page,
+                            annotation_map=annotation_map(user_acquisition) if annotations else {},
+                            dpi=dpi,
+                            image_format=image_format,
+                        )
+                    )
+                )
+
+            if cache_key:
+                content = render_cache.set(cache_key, content)
+
+        return file_response(
+            request,
+            content,
+            filename=f"{slugify(acquisition.entry.title.lower())}-{page}.{image_format}",
+            content_type=f"image/{image_format}",
+            as_attachment=False,
+            etag=f'"{cache_key}"' if cache_key else None,
+        )
+
+
+class EntryImageBase(SecuredView):
+    """
+    Cover and thumbnail downloads. Versioned URLs (Entry.image_url, Entry.thumbnail_url) are cached by clients as
+    immutable and conditional requests for them are answered before the database and storage are touched.
+    """
+
+    field: str
+    not_found: str
+
+    def _cache_headers(self, version: Optional[str], current_version: Optional[str] = None) -> dict:
+        if version and (current_version is None or version == current_version):
+            return {"ETag": f'"{version}"', "Cache-Control": "public, max-age=31536000, immutable"}
+
+        return {
+            "Cache-Control": f"public, max-age={int(settings.EVILFLOWERS_CACHE_CLIENT_IMAGES.total_seconds())}",
+        }
+
+    def _response(self, request, entry_id: uuid.UUID):
+        version = request.GET.get("v", None)
+
+        # Content of the versioned URL never changes
+        if version and f'"{version}"' in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            for header, value in self._cache_headers(version).items():
+                response[header] = value
+            return response
+
+        try:
+            entry = Entry.objects.only("id", "title", "image_mime", self.field).get(
+                pk=entry_id, **{f"{self.field}__isnull": False}
+            )
         except Entry.DoesNotExist:
-            raise ProblemDetailException(_("Entry thumbnail not found"), status=HTTPStatus.NOT_FOUND)
+            raise ProblemDetailException(_(self.not_found), status=HTTPStatus.NOT_FOUND)
 
+        file = getattr(entry, self.field)
+        current_version = Entry.file_version(file)
         sanitized_filename = f"{slugify(entry.title.lower())}{guess_extension(entry.image_mime)}"
 
-        if not entry.thumbnail.storage.exists(entry.thumbnail.name):
-            raise ProblemDetailException(_("Entry thumbnail file not found"), status=HTTPStatus.NOT_FOUND)
+        try:
+            response = file_response(
+                request,
+                file,
+                filename=sanitized_filename,
+                content_type=entry.image_mime,
+                as_attachment=False,
+                etag=f'"{current_version}"' if version == current_version else None,
+            )
+        except FileNotFoundError:
+            raise ProblemDetailException(_(self.not_found), status=HTTPStatus.NOT_FOUND)
+
+        # Presigned redirects expire, they have their own caching headers
+        if not isinstance(response, HttpResponseRedirect):
+            for header, value in self._cache_headers(version, current_version).items():
+                response[header] = value
+
+        return response
+
 
-        return FileResponse(streaming_content=entry.thumbnail, filename=sanitized_filename)
+class EntryImageDownload(EntryImageBase):
+    field = "image"
+    not_found = gettext_noop("Entry image not found")
+
+    @openapi.metadata(description="Download Entry cover image", tags=["Files"])
+    def get(self, request, entry_id: uuid.UUID):
+        return self._response(request, entry_id)
+
+
+class EntryThumbnailDownload(EntryImageBase):
+    field = "thumbnail"
+    not_found = gettext_noop("Entry thumbnail not found")
+
+    @openapi.metadata(description="Download Entry thumbnail", tags=["Files"])
+    def get(self, request, entry_id: uuid.UUID):
+        return self._response(request, entry_id)
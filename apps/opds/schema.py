@@ -118,7 +118,7 @@ class AcquisitionEntry(OpdsEntry, tag="entry"):
             acquisition_entry.links.append(
                 Link(
                     rel=LinkType.IMAGE,
-                    href=reverse("files:cover-download", kwargs={"entry_id": entry.id}),
+                    href=entry.image_url,
                     type=entry.image_mime,
                 )
             )
@@ -165,7 +165,8 @@ class LatestFeedView(OpdsCatalogView):
 
 class PopularFeedView(OpdsCatalogView):
     def get(self, request, catalog_name: str):
-        entries = Entry.objects.filter(catalog=self.catalog).order_by("-popularity")[
+        # Top-N of precomputed time-decayed ranking (entry_rankings_top_idx), not a scan of lifetime popularity
+        entries = Entry.objects.filter(ranking__catalog=self.catalog).order_by("-ranking__score")[
             : settings.EVILFLOWERS_FEEDS_NEW_LIMIT
         ]
 
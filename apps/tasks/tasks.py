@@ -1,6 +1,14 @@
+from datetime import timedelta
+
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management import call_command
+from django.utils import timezone
+
+from apps.core import analytics, popularity
+from apps.core.models import Acquisition, PageIndex
+from apps.files.storage import checksum_cache_key
 
 
 @shared_task
@@ -10,3 +18,34 @@ def backup():
             "backup",
             destination=settings.EVILFLOWERS_BACKUP_DESTINATION,
         )
+
+
+@shared_task
+def flush_popularity():
+    return popularity.flush()
+
+
+@shared_task
+def ingest_downloads():
+    return analytics.ingest()
+
+
+@shared_task
+def rollup_downloads():
+    # Yesterday is rolled up again to include events ingested after midnight
+    today = timezone.localdate()
+    return analytics.rollup(today - timedelta(days=1)) + analytics.rollup(today)
+
+
+# Acquisition may not be committed yet when the task is dispatched from its post_save signal
+@shared_task(autoretry_for=(Acquisition.DoesNotExist,), retry_backoff=True, max_retries=5)
+def index_acquisition(acquisition_id: str):
+    PageIndex.objects.build(Acquisition.objects.get(pk=acquisition_id))
+
+
+@shared_task(autoretry_for=(Acquisition.DoesNotExist,), retry_backoff=True, max_retries=5)
+def refresh_checksum(acquisition_id: str):
+    # OCR rewrites the content in place, checksum cached on upload describes the original file
+    acquisition = Acquisition.objects.get(pk=acquisition_id)
+    cache.delete(checksum_cache_key(acquisition.content.name))
+    return acquisition.checksum
@@ -18,7 +18,20 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
-app.conf.beat_schedule = {}
+app.conf.beat_schedule = {
+    "flush_popularity": {
+        "task": "apps.tasks.tasks.flush_popularity",
+        "schedule": settings.EVILFLOWERS_POPULARITY_FLUSH_INTERVAL,
+    },
+    "ingest_downloads": {
+        "task": "apps.tasks.tasks.ingest_downloads",
+        "schedule": settings.EVILFLOWERS_ANALYTICS_INGEST_INTERVAL,
+    },
+    "rollup_downloads": {
+        "task": "apps.tasks.tasks.rollup_downloads",
+        "schedule": crontab(minute=5),
+    },
+}
 
 if settings.EVILFLOWERS_BACKUP_DESTINATION and settings.EVILFLOWERS_BACKUP_SCHEDULE:
     minute, hour, day_of_month, month_of_year, day_of_week = settings.EVILFLOWERS_BACKUP_SCHEDULE.strip().split(" ")
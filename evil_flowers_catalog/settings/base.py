@@ -263,11 +263,38 @@ EVILFLOWERS_STORAGE_DRIVER = os.getenv("EVILFLOWERS_STORAGE_DRIVER", "apps.files
 EVILFLOWERS_STORAGE_FILESYSTEM_DATADIR = os.getenv(
     "EVILFLOWERS_STORAGE_FILESYSTEM_DATADIR", BASE_DIR / "data/evilflowers/storage"
 )
+# Offload file transfers of FileSystemStorage to the front proxy: None, "x-accel-redirect" (nginx) or "x-sendfile"
+# nginx: location /internal/storage/ { internal; alias <EVILFLOWERS_STORAGE_FILESYSTEM_DATADIR>/; }
+EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD = os.getenv("EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD")
+EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD_LOCATION = os.getenv(
+    "EVILFLOWERS_STORAGE_FILESYSTEM_OFFLOAD_LOCATION", "/internal/storage/"
+)
 EVILFLOWERS_STORAGE_S3_HOST = os.getenv("EVILFLOWERS_STORAGE_S3_HOST")
 EVILFLOWERS_STORAGE_S3_ACCESS_KEY = os.getenv("EVILFLOWERS_STORAGE_S3_ACCESS_KEY")
 EVILFLOWERS_STORAGE_S3_SECRET_KEY = os.getenv("EVILFLOWERS_STORAGE_S3_SECRET_KEY")
 EVILFLOWERS_STORAGE_S3_SECURE = bool(int(os.getenv("EVILFLOWERS_STORAGE_S3_SECURE", 0)))
 EVILFLOWERS_STORAGE_S3_BUCKET = os.getenv("EVILFLOWERS_STORAGE_S3_BUCKET")
+# Clients are shared per process, these options apply to their urllib3 connection pools
+EVILFLOWERS_STORAGE_S3_POOL_SIZE = int(os.getenv("EVILFLOWERS_STORAGE_S3_POOL_SIZE", 10))
+EVILFLOWERS_STORAGE_S3_TIMEOUT = int(os.getenv("EVILFLOWERS_STORAGE_S3_TIMEOUT", 5 * 60))  # seconds
+EVILFLOWERS_STORAGE_S3_RETRIES = int(os.getenv("EVILFLOWERS_STORAGE_S3_RETRIES", 5))
+EVILFLOWERS_STORAGE_S3_KEEPALIVE = bool(int(os.getenv("EVILFLOWERS_STORAGE_S3_KEEPALIVE", 1)))
+# Uploads are streamed as multipart uploads, memory per upload is bounded by part size (min. 5MB)
+EVILFLOWERS_STORAGE_S3_PART_SIZE = int(os.getenv("EVILFLOWERS_STORAGE_S3_PART_SIZE", 16)) * 1024 * 1024  # MB
+# Local read-through cache of apps.files.storage.cached.CachedS3Storage
+EVILFLOWERS_STORAGE_CACHE_DATADIR = os.getenv("EVILFLOWERS_STORAGE_CACHE_DATADIR", BASE_DIR / "data/evilflowers/cache")
+EVILFLOWERS_STORAGE_CACHE_MAX_SIZE = (
+    int(os.getenv("EVILFLOWERS_STORAGE_CACHE_MAX_SIZE", 10 * 1024)) * 1024 * 1024
+)  # MB
+EVILFLOWERS_STORAGE_CACHE_STAT_TTL = timedelta(seconds=int(os.getenv("EVILFLOWERS_STORAGE_CACHE_STAT_TTL", 5 * 60)))
+# Redirect downloads of unmodified files to short-lived presigned URLs instead of proxying them through Django
+EVILFLOWERS_STORAGE_S3_REDIRECT = bool(int(os.getenv("EVILFLOWERS_STORAGE_S3_REDIRECT", 0)))
+EVILFLOWERS_STORAGE_S3_REDIRECT_EXPIRATION = timedelta(
+    seconds=int(os.getenv("EVILFLOWERS_STORAGE_S3_REDIRECT_EXPIRATION", 5 * 60))
+)
+# Host used in presigned URLs if clients can not reach EVILFLOWERS_STORAGE_S3_HOST (e.g. internal Docker network)
+EVILFLOWERS_STORAGE_S3_PUBLIC_HOST = os.getenv("EVILFLOWERS_STORAGE_S3_PUBLIC_HOST")
+EVILFLOWERS_STORAGE_S3_REGION = os.getenv("EVILFLOWERS_STORAGE_S3_REGION")
 
 # Readium
 EVILFLOWERS_READIUM_DATADIR = str(os.getenv("EVILFLOWERS_READIUM_DATADIR", BASE_DIR / "data/evilflowers/readium"))
@@ -284,9 +311,49 @@ EVILFLOWERS_READIUM_BASE_URL = os.getenv(
 EVILFLOWERS_CACHE_SERVER_HASHES = timedelta(minutes=int(os.getenv("EVILFLOWERS_CACHE_HASHES", 7 * 24 * 60)))
 EVILFLOWERS_CACHE_SERVER_API_KEYS = timedelta(minutes=int(os.getenv("EVILFLOWERS_CACHE_API_KEYS", 0)))
 EVILFLOWERS_CACHE_CLIENT_IMAGES = timedelta(minutes=int(os.getenv("EVILFLOWERS_CACHE_CLIENT_IMAGES", 24 * 60)))
+EVILFLOWERS_CACHE_SERVER_PERMISSIONS = timedelta(minutes=int(os.getenv("EVILFLOWERS_CACHE_PERMISSIONS", 60)))
+
+# Popularity
+# Download counters are buffered in Redis and flushed to Entry.popularity periodically by Celery beat
+EVILFLOWERS_POPULARITY_FLUSH_INTERVAL = timedelta(seconds=int(os.getenv("EVILFLOWERS_POPULARITY_FLUSH_INTERVAL", 60)))
+# Downloads in popular feeds and "trending" ordering lose half of their weight after this period
+EVILFLOWERS_POPULARITY_HALF_LIFE = timedelta(days=int(os.getenv("EVILFLOWERS_POPULARITY_HALF_LIFE", 14)))
+
+# Analytics
+# Download events are buffered in-process, pushed to Redis stream and ingested to download_events by Celery beat
+EVILFLOWERS_ANALYTICS_BUFFER_SIZE = int(os.getenv("EVILFLOWERS_ANALYTICS_BUFFER_SIZE", 100))
+EVILFLOWERS_ANALYTICS_BUFFER_TIMEOUT = timedelta(seconds=int(os.getenv("EVILFLOWERS_ANALYTICS_BUFFER_TIMEOUT", 5)))
+EVILFLOWERS_ANALYTICS_STREAM_MAXLEN = int(os.getenv("EVILFLOWERS_ANALYTICS_STREAM_MAXLEN", 1_000_000))
+EVILFLOWERS_ANALYTICS_INGEST_INTERVAL = timedelta(seconds=int(os.getenv("EVILFLOWERS_ANALYTICS_INGEST_INTERVAL", 60)))
 
 # Modifiers
-EVILFLOWERS_MODIFIERS = {"application/pdf": "apps.core.modifiers.pdf.PDFModifier"}
+EVILFLOWERS_MODIFIERS = {
+    "application/pdf": "apps.core.modifiers.pdf.PDFModifier",
+}
+# EPUB acquisitions are personalized (license page, metadata) only if enabled, they are served unmodified otherwise
+if bool(int(os.getenv("EVILFLOWERS_MODIFIERS_EPUB", "0"))):
+    EVILFLOWERS_MODIFIERS["application/epub+zip"] = "apps.core.modifiers.epub.EPUBModifier"
+# Modifiers run in a pool of worker processes (per application process), pool of size 0 runs them inline
+EVILFLOWERS_MODIFIERS_POOL_SIZE = int(os.getenv("EVILFLOWERS_MODIFIERS_POOL_SIZE", 2))
+EVILFLOWERS_MODIFIERS_POOL_QUEUE = int(os.getenv("EVILFLOWERS_MODIFIERS_POOL_QUEUE", 8))
+EVILFLOWERS_MODIFIERS_POOL_TIMEOUT = timedelta(seconds=int(os.getenv("EVILFLOWERS_MODIFIERS_POOL_TIMEOUT", 60)))
+# PDF output profiles (fast, balanced, archival) of single pages and whole documents, overridden by the entry config
+EVILFLOWERS_MODIFIERS_PROFILE_PAGE = os.getenv("EVILFLOWERS_MODIFIERS_PROFILE_PAGE", "fast")
+EVILFLOWERS_MODIFIERS_PROFILE_DOCUMENT = os.getenv("EVILFLOWERS_MODIFIERS_PROFILE_DOCUMENT", "balanced")
+# Local cache of generated outputs (per user acquisition, page range and annotations), disabled with size 0
+EVILFLOWERS_MODIFIERS_CACHE_DATADIR = os.getenv(
+    "EVILFLOWERS_MODIFIERS_CACHE_DATADIR", BASE_DIR / "data/evilflowers/modifiers"
+)
+EVILFLOWERS_MODIFIERS_CACHE_MAX_SIZE = (
+    int(os.getenv("EVILFLOWERS_MODIFIERS_CACHE_MAX_SIZE", 5 * 1024)) * 1024 * 1024
+)  # MB
+# Rendering of PDF pages as images (in the modifier pool), rendered pages are cached locally, disabled with size 0
+EVILFLOWERS_RENDER_DPI = int(os.getenv("EVILFLOWERS_RENDER_DPI", 150))
+EVILFLOWERS_RENDER_MAX_DPI = int(os.getenv("EVILFLOWERS_RENDER_MAX_DPI", 300))
+# Resolution of large pages is reduced to keep rendered images under this number of pixels
+EVILFLOWERS_RENDER_MAX_PIXELS = int(os.getenv("EVILFLOWERS_RENDER_MAX_PIXELS", 25_000_000))
+EVILFLOWERS_RENDER_CACHE_DATADIR = os.getenv("EVILFLOWERS_RENDER_CACHE_DATADIR", BASE_DIR / "data/evilflowers/pages")
+EVILFLOWERS_RENDER_CACHE_MAX_SIZE = int(os.getenv("EVILFLOWERS_RENDER_CACHE_MAX_SIZE", 2 * 1024)) * 1024 * 1024  # MB
 
 # Admin
 EVILFLOWERS_CONTACT_EMAIL = os.getenv("CONTACT_EMAIL", "root@localhost")